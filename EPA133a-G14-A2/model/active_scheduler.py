@@ -0,0 +1,162 @@
+from mesa.time import BaseScheduler
+
+from components import Infra, Source, Sink, Vehicle
+
+"""
+    Scheduler that only steps the agents that have something to do
+
+    BaseScheduler calls step() on every agent every tick, but most infrastructure agents (links,
+    bridges, intersections) have no behaviour of their own, a source only does something at its
+    generation ticks and a sink only resets its list of removed vehicles after it removed some.
+    The ActiveScheduler skips all those no-op steps, so the time per tick grows with the number of
+    vehicles on the road, not with the size of the network.
+"""
+
+
+# ---------------------------------------------------------------
+class ActiveScheduler(BaseScheduler):
+    """
+    Activates, every tick and in the order they were added (like BaseScheduler):
+    - the sources at their generation ticks, and at the tick after it to reset vehicle_generated_flag
+    - the sinks that removed vehicles in an earlier tick, to reset vehicle_removed_driving_time
+    - all vehicles that were on the road at the start of the tick
+    - any other infrastructure agent with a step of its own
+
+    Skipped agents would not have changed anything, so a run gives the same results as with BaseScheduler.
+
+    Attributes
+    __________
+    active_infra: list
+        the infrastructure agents with a step of their own, in the order they were added
+
+    vehicles: dict
+        Key: unique_id
+        Value: the vehicles on the road, in the order they were added
+    """
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.active_infra = []
+        self.vehicles = {}
+
+    def add(self, agent):
+        super().add(agent)
+        if isinstance(agent, Vehicle):
+            self.vehicles[agent.unique_id] = agent
+        elif not (isinstance(agent, Infra) and type(agent).step is Infra.step):
+            self.active_infra.append(agent)
+
+    def remove(self, agent):
+        super().remove(agent)
+        if isinstance(agent, Vehicle):
+            del self.vehicles[agent.unique_id]
+        elif agent in self.active_infra:
+            self.active_infra.remove(agent)
+
+    def has_work(self, agent):
+        """
+        Whether stepping the infrastructure agent in this tick could change anything
+        """
+        if isinstance(agent, Source) and (self.steps % agent.generation_frequency == 0 or
+                                          agent.vehicle_generated_flag):
+            return True
+        if isinstance(agent, Sink) and agent.vehicle_removed_driving_time:
+            return True
+        return not isinstance(agent, (Source, Sink))
+
+    def step(self):
+        """
+        Step the agents that have work to do in this tick
+        """
+        # the vehicles generated in this tick are not stepped until the next tick
+        vehicles = list(self.vehicles.items())
+        for agent in [agent for agent in self.active_infra if self.has_work(agent)]:
+            agent.step()
+        for unique_id, vehicle in vehicles:
+            if self.vehicles.get(unique_id) is vehicle:
+                vehicle.step()
+        self.steps += 1
+        self.time += 1
+
+
+# ---------------------------------------------------------------
+class FastForwardScheduler(ActiveScheduler):
+    """
+    ActiveScheduler that also lets vehicles sleep through the ticks in which they have nothing to do
+
+    After its step, a vehicle that will only drive along its current component (or only wait at a
+    bridge) for the next ticks is put in a wake-up calendar at the tick it reaches the next component
+    (or is done waiting), and is not stepped before that tick. When it wakes up, it first catches up
+    with the skipped ticks (Vehicle.skip) and then steps as usual, so the run gives exactly the same
+    results as stepping every vehicle every tick. The work per tick follows the number of vehicles
+    that cross into a next component, not the number of vehicles on the road.
+
+    The state of a sleeping vehicle is only caught up when it wakes up; call synchronize() before
+    looking at the vehicles (BangladeshModel does so before the DataCollector collects).
+
+    Attributes
+    __________
+    awake: dict
+        Key: unique_id
+        Value: the vehicles to step in the next tick
+
+    calendar: dict
+        Key: tick
+        Value: the vehicles that wake up at that tick
+    """
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.awake = {}
+        self.calendar = {}
+
+    def add(self, agent):
+        super().add(agent)
+        if isinstance(agent, Vehicle):
+            agent.synced_at = self.steps
+            self.awake[agent.unique_id] = agent
+
+    def remove(self, agent):
+        super().remove(agent)
+        if isinstance(agent, Vehicle):
+            self.awake.pop(agent.unique_id, None)
+
+    def step(self):
+        """
+        Step the agents that have work to do in this tick, and the vehicles that are awake
+        """
+        tick = self.steps
+        woken = self.calendar.pop(tick, [])
+        for vehicle in woken:
+            vehicle.skip(tick - 1 - vehicle.synced_at)
+        # in the order they were added, as BaseScheduler does; the vehicles generated in this tick
+        # are not stepped until the next tick
+        vehicles = sorted(list(self.awake.values()) + woken, key=lambda vehicle: vehicle.number)
+        self.awake = {}
+        for agent in [agent for agent in self.active_infra if self.has_work(agent)]:
+            agent.step()
+        for vehicle in vehicles:
+            unique_id = vehicle.unique_id
+            if self.vehicles.get(unique_id) is not vehicle:
+                continue
+            vehicle.step()
+            vehicle.synced_at = tick
+            if self.vehicles.get(unique_id) is not vehicle:
+                # removed by a sink
+                continue
+            idle_ticks = vehicle.idle_ticks()
+            if idle_ticks > 0:
+                self.calendar.setdefault(tick + 1 + idle_ticks, []).append(vehicle)
+            else:
+                self.awake[unique_id] = vehicle
+        self.steps += 1
+        self.time += 1
+
+    def synchronize(self):
+        """
+        Catch up all sleeping vehicles with the ticks they skipped so far
+        """
+        for vehicles in self.calendar.values():
+            for vehicle in vehicles:
+                vehicle.skip(self.steps - 1 - vehicle.synced_at)
+                vehicle.synced_at = self.steps - 1
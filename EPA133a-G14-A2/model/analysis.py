@@ -0,0 +1,163 @@
+import os
+import re
+import glob
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from trip_writer import columns, read_trips
+from steady_state import mser
+from atomic_files import atomic_path
+
+"""
+    Loading and summarizing the output of an experiment
+
+    load_trips reads the outputs of all (scenario, seed) runs of an experiment, in parallel, into
+    one long-format table with one row per trip and the columns of trip_writer.py. It reads the
+    typed trip files of run_batch, or, for an experiment that has none, the csv files of the legacy
+    DataCollector output of the original model (Scenario<scenario>_sim<run>.csv, such as the ones
+    committed in experiment/), whose trip lists are parsed with one vectorized regex instead of
+    literal_eval per cell. The table is cached in a pickle file in
+    the output directory, which is used as long as none of the outputs has changed.
+"""
+
+# one ['Truck<id>', <travel time>] entry of the trip list in a cell of the old output
+trip_pattern = re.compile(r"\['Truck(\d+)',\s*(-?\d+)\]")
+
+# the name of the cache file of the parsed table, in the output directory
+cache_name = '.trips.pickle'
+
+
+# ---------------------------------------------------------------
+def find_outputs(output_dir):
+    """
+    The (path, scenario, seed) of every run output in output_dir, sorted by scenario and seed
+
+    The trip files of run_batch if there are any, else the files of the old DataCollector output,
+    where the seed is the run number of the file name
+    """
+    outputs = []
+    for path in glob.glob(os.path.join(output_dir, 'trips', 'scenario=*', 'seed=*.*')):
+        match = re.search(r'scenario=(\d+)[/\\]seed=(\d+)\.\w+$', path)
+        if match and not path.endswith('.tmp'):
+            outputs.append((path, int(match.group(1)), int(match.group(2))))
+    if not outputs:
+        for path in glob.glob(os.path.join(output_dir, 'Scenario*_sim*.csv')):
+            match = re.search(r'Scenario(\d+)_sim(\d+)\.csv$', path)
+            if match:
+                outputs.append((path, int(match.group(1)), int(match.group(2))))
+    return sorted(outputs, key=lambda output: output[1:])
+
+
+def read_legacy(path, scenario, seed):
+    """
+    The trips in a csv file of the old DataCollector output, with the columns of trip_writer.py
+
+    Every row holds the trips that left the model at a sink in one tick, as a list of
+    ['Truck<id>', <travel time>] pairs; all pairs of all rows are extracted in one go. The
+    origin of a trip and its delay are not in these files (-1 and NaN).
+    """
+    df = pd.read_csv(path, usecols=['Step', 'AgentID', 'Driving time of cars leaving'])
+    pairs = df['Driving time of cars leaving'].str.extractall(trip_pattern)
+    # the row of the file every trip is in
+    rows = pairs.index.get_level_values(0).to_numpy()
+    travel_time = pairs[1].to_numpy(dtype=np.int64)
+    # the step of a row is one after the tick in which its trucks were removed
+    end = df['Step'].to_numpy(dtype=np.int64)[rows] - 1
+    n = len(rows)
+    return pd.DataFrame({
+        'scenario': np.full(n, scenario, dtype=np.int64),
+        'seed': np.full(n, seed, dtype=np.int64),
+        'truck_id': pairs[0].to_numpy(dtype=np.int64),
+        'origin': np.full(n, -1, dtype=np.int64),
+        'sink': df['AgentID'].to_numpy(dtype=np.int64)[rows],
+        'start': end - travel_time,
+        'end': end,
+        'travel_time': travel_time,
+        'delay': np.full(n, np.nan),
+    })
+
+
+def read_output(output):
+    """
+    The trips of one (path, scenario, seed) output; the function executed in the worker processes
+    """
+    path, scenario, seed = output
+    if os.path.basename(path).startswith('seed='):
+        return read_trips(path)
+    return read_legacy(path, scenario, seed)
+
+
+# ---------------------------------------------------------------
+def load_trips(output_dir='../model/experiment', workers=None, use_cache=True):
+    """
+    All trips of all runs in output_dir as one dataframe, sorted by scenario and seed
+
+    workers: int
+        the number of worker processes the files are read with; None uses all available cores
+        and 1 reads them in this process
+
+    use_cache: bool
+        use (and update) the cache file of the parsed table; it is only used if the same outputs,
+        with the same modification times and sizes, were parsed into it
+    """
+    outputs = find_outputs(output_dir)
+    signature = [(os.path.relpath(path, output_dir), os.stat(path).st_mtime_ns, os.stat(path).st_size)
+                 for path, _, _ in outputs]
+    cache_path = os.path.join(output_dir, cache_name)
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['signature'] == signature:
+            return cached['trips']
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(outputs)))
+    if workers == 1:
+        frames = [read_output(output) for output in outputs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(read_output, outputs))
+    empty = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in columns.items()})
+    trips = pd.concat([empty] + frames, ignore_index=True)
+
+    if use_cache:
+        # write to a temporary file of this process first, so a process never reads a half-written cache
+        with atomic_path(cache_path) as tmp_path, open(tmp_path, 'wb') as f:
+            pickle.dump({'signature': signature, 'trips': trips}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return trips
+
+
+# ---------------------------------------------------------------
+def scenario_arrays(trips, column='travel_time'):
+    """
+    Dict scenario -> the values of a column of all trips of the scenario, over all seeds
+    """
+    return {scenario: values.to_numpy() for scenario, values in trips.groupby('scenario')[column]}
+
+
+def remove_warmup(trips, batch_size=5):
+    """
+    The trips without the warm-up of every run, found with MSER-5 (see steady_state.py) on the
+    trip times of the run in the order the trips ended
+    """
+    ordered = trips.sort_values(['scenario', 'seed', 'end', 'truck_id'], kind='stable')
+    runs = [run.iloc[mser(run['travel_time'].to_numpy(), batch_size):]
+            for _, run in ordered.groupby(['scenario', 'seed'], sort=False)]
+    return pd.concat(runs) if runs else ordered
+
+
+def summary(trips, column='travel_time', quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """
+    Summary statistics of a column of the trips, per scenario: the number of trips, the mean, the
+    standard deviation, the minimum, the given quantiles and the maximum
+    """
+    grouped = trips.groupby('scenario')[column]
+    stats = grouped.agg(['count', 'mean', 'std', 'min'])
+    for q in quantiles:
+        stats[f'{q:.0%}'] = grouped.quantile(q)
+    stats['max'] = grouped.max()
+    return stats
@@ -0,0 +1,174 @@
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from components import Vehicle, Source
+from trip_log import TripLog
+from network import load_network
+from bridge_delays import BridgeDelays
+from random_streams import RandomStreams
+import scenarios
+
+"""
+    Analytic fast-path engine for congestion-free runs
+
+    The trucks of BangladeshModel never interact, so the trip of a truck only depends on the
+    tick at which it is generated, its route and the delays it gets at the broken bridges on
+    that route. This module computes all trips of a run at once with NumPy instead of stepping
+    every agent every tick.
+
+    The tick rules of components.Vehicle are followed exactly:
+    - a truck generated at tick g drives for the first time at tick g + 1, Vehicle.speed per tick
+    - it arrives at a component in the first tick in which it drives past the start of it
+    - at a broken bridge it stops at the start of the bridge; a delay of d minutes keeps it
+      there for ceil(d) ticks, after which it drives on in that same tick
+    - the tick in which it arrives at the sink is its removed_at_step
+    The route choice, the broken bridges and the delay times (per bridge and tick, from
+    BridgeDelays) come from the same random streams as in the Mesa model, so the trips are identical.
+"""
+
+
+# ---------------------------------------------------------------
+def broken_bridges(network, scenario, seed):
+    """
+    The ids of the bridges that are broken in this scenario, as in BangladeshModel.generate_model
+
+    The ids are in the order of the network
+    """
+    bridges = network.bridges
+    broken = scenarios.broken_bridges(seed, scenario, bridges.index, bridges['condition'])
+    return list(bridges.index[broken])
+
+
+def generate_trucks(network, seed, run_length):
+    """
+    The trucks the sources generate in a run: truck number, origin, destination and generation tick
+
+    Every source draws the destinations of all its trucks at once from its own random stream,
+    which gives the same destinations as BangladeshModel.get_random_sink drawing them one by one
+    """
+    streams = RandomStreams(seed)
+    sources = network.sources
+    steps = np.arange(0, run_length, Source.generation_frequency)
+    trucks = np.empty((len(steps), len(sources), 4), dtype=np.int64)
+    for i, source in enumerate(sources):
+        destinations = np.array(network.destinations(source), dtype=np.int64)
+        rng = streams.generator(RandomStreams.SOURCE, source)
+        trucks[:, i, 1] = source
+        trucks[:, i, 2] = destinations[rng.integers(len(destinations), size=len(steps))]
+        trucks[:, i, 3] = steps
+    # within a tick the sources generate their trucks in the order of the schedule
+    trucks = trucks.reshape(-1, 4)
+    trucks[:, 0] = np.arange(len(trucks))
+    return trucks
+
+
+# ---------------------------------------------------------------
+def simulate(scenario, seed, run_length, data_path='../data/N1.csv'):
+    """
+    Compute all trips of one run and return them as a TripLog
+
+    Only the trucks that reach their sink within run_length ticks are part of the log,
+    just like in a BangladeshModel run of run_length steps
+    """
+    network = load_network(data_path)
+    broken = set(broken_bridges(network, scenario, seed))
+    # the delay index of a bridge is its position among the bridges of the network, as in the model
+    delay_index = {bridge_id: i for i, bridge_id in enumerate(network.bridges.index) if bridge_id in broken}
+    # the delay times of every bridge at every tick of the run
+    delay_table = BridgeDelays(RandomStreams(seed).key(RandomStreams.DELAYS),
+                               list(network.bridges['length'])).table(run_length)
+    distance = Vehicle.speed * Vehicle.step_time
+
+    trucks = generate_trucks(network, seed, run_length)
+    removed_at_step = np.empty(len(trucks), dtype=np.int64)
+    delays = np.zeros(len(trucks))
+
+    route_table = network.route_table
+    for origin, destination in np.unique(trucks[:, 1:3], axis=0).tolist():
+        route = route_table.route(origin, destination)
+        path_ids = route_table.path_ids(route)
+        starts = route_table.starts[route]
+        on_route = (trucks[:, 1] == origin) & (trucks[:, 2] == destination)
+        # the first tick each truck drives from the current position
+        driving_from = trucks[on_route, 3] + 1
+        total_delay = np.zeros(len(driving_from))
+        position = 0.0
+        for bridge_id, start in zip(path_ids, starts):
+            if bridge_id not in delay_index:
+                continue
+            # the number of ticks to drive past the start of the bridge, the last one is the arrival tick
+            ticks = math.floor((start - position) / distance) + 1
+            arrived_at = driving_from + ticks - 1
+            # trucks that arrive after the end of the run do not finish anyway
+            delay = delay_table[np.minimum(arrived_at, run_length - 1), delay_index[bridge_id]]
+            total_delay += delay
+            driving_from = arrived_at + np.ceil(delay).astype(np.int64)
+            position = start
+        # the sink is the last component of the path
+        ticks = math.floor((starts[-1] - position) / distance) + 1
+        removed_at_step[on_route] = driving_from + ticks - 1
+        delays[on_route] = total_delay
+
+    done = removed_at_step < run_length
+    return TripLog.from_columns(truck_id=trucks[done, 0], origin=trucks[done, 1], destination=trucks[done, 2],
+                                generated_at_step=trucks[done, 3], removed_at_step=removed_at_step[done],
+                                delay=delays[done])
+
+
+def run_replications(scenario, seed_list, run_length, data_path='../data/N1.csv'):
+    """
+    Simulate one run per seed and return all trips as one dataframe with a seed column
+    """
+    frames = []
+    for seed in seed_list:
+        df = simulate(scenario, seed, run_length, data_path).to_dataframe()
+        df.insert(0, 'seed', seed)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------------------------------------------------------------
+def validate(scenario, seed, run_length):
+    """
+    Compare the analytic engine with a BangladeshModel run with the same inputs
+
+    Returns a dict with the number of trips, the mean and standard deviation of the driving
+    time of both engines, the two-sample Kolmogorov-Smirnov statistic of the driving times,
+    and whether the trips are identical (which they should be)
+    """
+    from model import BangladeshModel
+
+    start = time.time()
+    sim_model = BangladeshModel(scenario=scenario, seed=seed, trip_log=True)
+    for k in range(run_length):
+        sim_model.step()
+    mesa_time = time.time() - start
+    mesa_trips = sim_model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+
+    start = time.time()
+    analytic_trips = simulate(scenario, seed, run_length).to_dataframe()
+    analytic_time = time.time() - start
+
+    identical = mesa_trips.equals(analytic_trips)
+
+    a = np.sort(mesa_trips['driving_time'].to_numpy())
+    b = np.sort(analytic_trips['driving_time'].to_numpy())
+    values = np.concatenate((a, b))
+    ks_statistic = np.max(np.abs(np.searchsorted(a, values, side='right') / len(a) -
+                                 np.searchsorted(b, values, side='right') / len(b)))
+    return {
+        'trips': (len(a), len(b)),
+        'mean driving time': (a.mean(), b.mean()),
+        'std driving time': (a.std(), b.std()),
+        'ks statistic': ks_statistic,
+        'identical': identical,
+        'wall time': (mesa_time, analytic_time),
+    }
+
+
+if __name__ == '__main__':
+    for scenario in [0, 4, 8]:
+        print('scenario', scenario, validate(scenario, 1234567, 7200))
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import contextlib
+
+"""
+    Atomic file writes that are safe with several processes
+
+    A file is written to a temporary file next to it and then moved into place with os.replace,
+    so a reader never sees a half-written file. The temporary file has a name of its own, so
+    processes that write the same file at the same time (e.g. the workers of a sweep that all
+    rebuild a cache) never write into each other's temporary file; the last one to finish wins.
+"""
+
+
+# ---------------------------------------------------------------
+@contextlib.contextmanager
+def atomic_path(path, suffix='.tmp'):
+    """
+    Context manager that gives a new temporary path to write `path` to
+
+    The temporary file is moved to `path` when the block ends, or removed if the block raises
+
+    suffix: str
+        the end of the temporary file name, for writers that look at it (e.g. '.npz' for np.savez)
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
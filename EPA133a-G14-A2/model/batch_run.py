@@ -0,0 +1,182 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from model import BangladeshModel
+from network import load_network, SharedNetwork, attach
+from steady_state import SteadyStateMonitor
+from trip_writer import TripWriter, trip_path
+from atomic_files import atomic_path
+
+"""
+    Run a scenario x seed sweep of BangladeshModel over a pool of worker processes
+
+    Every (scenario, seed) combination is one job. A job builds its own model, runs it and streams
+    its trips to its own file (see trip_writer.py), so the output of a job does not depend on which
+    worker ran it or on the order in which the jobs finish. The static network data is shared by all workers
+    (see network.SharedNetwork).
+"""
+
+
+# ---------------------------------------------------------------
+def output_path(output_dir, scenario, seed):
+    """
+    The file a (scenario, seed) job writes its trips to
+    """
+    return trip_path(output_dir, scenario, seed)
+
+
+def profile_path(output_dir, scenario, seed):
+    """
+    The file the profile of a (scenario, seed) job is written to
+    """
+    return os.path.join(output_dir, 'profiles', f'scenario={scenario}', f'seed={seed}.csv')
+
+
+def run_job(scenario, seed, run_length, output_dir, early_stop=None, profile=False):
+    """
+    Run a single job of the sweep and write its trips; returns the path of the written file
+
+    The trips are written in batches while the model runs. This is the function executed in the worker processes
+
+    early_stop: float
+        if given, the run stops before run_length once the confidence interval of the mean trip time
+        after the warm-up is within this fraction of the mean (see steady_state.py)
+
+    profile: bool
+        if True, the calls and wall time of the hot paths of the run (see profiling.py) are written
+        to the csv file at profile_path
+    """
+    path = output_path(output_dir, scenario, seed)
+    # write to a temporary file of this job first, so an interrupted job does not leave a half-written result
+    with atomic_path(path) as tmp_path, TripWriter(tmp_path, scenario, seed) as writer:
+        steady_state = None if early_stop is None else SteadyStateMonitor(tolerance=early_stop)
+        sim_model = BangladeshModel(scenario=scenario, seed=seed, trip_writer=writer, steady_state=steady_state,
+                                    profile=profile)
+        try:
+            for k in range(run_length):
+                if not sim_model.running:
+                    break
+                sim_model.step()
+            sim_model.flush_trips()
+        finally:
+            # also when the run fails, so the later jobs of this worker are not slowed down by the timers
+            if profile:
+                sim_model.profiler.close()
+    if profile:
+        profile_file = profile_path(output_dir, scenario, seed)
+        os.makedirs(os.path.dirname(profile_file), exist_ok=True)
+        sim_model.profiler.table().to_csv(profile_file, index=False)
+    return path
+
+
+def format_duration(seconds):
+    """
+    Format a number of seconds as h:mm:ss
+    """
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+# ---------------------------------------------------------------
+def run_batch(scenario_list, seed_list, run_length, output_dir='../model/experiment', workers=None,
+              store=None, early_stop=None, profile=False):
+    """
+    Run every (scenario, seed) combination, spread over a pool of `workers` processes
+
+    See run_jobs for the arguments and the return value
+    """
+    all_jobs = [(scenario, seed) for scenario in scenario_list for seed in seed_list]
+    return run_jobs(all_jobs, run_length, output_dir, workers, store, early_stop, profile)
+
+
+def run_jobs(all_jobs, run_length, output_dir='../model/experiment', workers=None, store=None, early_stop=None,
+             profile=False):
+    """
+    Run the given (scenario, seed) jobs, spread over a pool of `workers` processes
+
+    workers: int
+        the number of worker processes; None uses all available cores and 1 runs
+        the jobs one after the other in this process
+
+    store: ResultStore
+        if given, jobs whose results are already in the store are not run again but
+        copied from it, and every finished job is added to it. A sweep that was
+        interrupted therefore continues where it stopped.
+
+    early_stop: float
+        if given, every run stops as soon as its steady-state mean trip time has converged
+        to within this fraction (see run_job); run_length is then the maximum run length
+
+    profile: bool
+        if True, every job that is run writes its profile (see run_job); the jobs taken from
+        the store have none
+
+    A job that raises does not stop the others. The failed jobs are reported at the end
+    and returned as a dict of (scenario, seed) -> exception.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # take the runs that are already done from the store
+    jobs = all_jobs
+    keys = {}
+    if store is not None:
+        keys = {job: store.key(*job, run_length, early_stop) for job in all_jobs}
+        jobs = []
+        for job in all_jobs:
+            if keys[job] in store:
+                store.get(keys[job], output_path(output_dir, *job))
+            else:
+                jobs.append(job)
+        print(f"{len(all_jobs) - len(jobs)} / {len(all_jobs)} runs taken from the result store", flush=True)
+
+    number_of_runs = len(jobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, number_of_runs))
+
+    failed = {}
+    counter = 0
+    start = time.time()
+
+    def report(job, error=None):
+        nonlocal counter
+        scenario, seed = job
+        counter += 1
+        if error is None and store is not None:
+            store.put(keys[job], output_path(output_dir, scenario, seed), scenario, seed, run_length, early_stop)
+        elapsed = time.time() - start
+        eta = elapsed / counter * (number_of_runs - counter)
+        status = 'Done' if error is None else f'FAILED ({error.__class__.__name__}: {error})'
+        print(f"{counter} / {number_of_runs} {status}: scenario: {scenario} seed: {seed}"
+              f" | elapsed {format_duration(elapsed)} | ETA {format_duration(eta)}", flush=True)
+
+    if workers == 1:
+        for job in jobs:
+            try:
+                run_job(*job, run_length, output_dir, early_stop, profile)
+            except Exception as e:
+                failed[job] = e
+                report(job, e)
+            else:
+                report(job)
+    else:
+        # publish the network once in shared memory; the workers attach to it instead of loading their own copy
+        with SharedNetwork(load_network()) as shared, \
+                ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shared.layout,)) as executor:
+            futures = {executor.submit(run_job, *job, run_length, output_dir, early_stop, profile): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[job] = e
+                    report(job, e)
+                else:
+                    report(job)
+
+    print(f"Sweep finished in {format_duration(time.time() - start)}: "
+          f"{number_of_runs - len(failed)} / {number_of_runs} runs done, {len(failed)} failed")
+    for (scenario, seed), error in failed.items():
+        print('  scenario:', scenario, 'seed:', seed, '->', repr(error))
+    return failed
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+
+from model import BangladeshModel
+from components import Source, Bridge
+from batch_run import run_batch
+
+"""
+    Benchmark suite of the model
+
+    Measures, with fixed seeds and scenarios:
+    - build: the construction of a model (generate_model), with the network already loaded in the process
+    - steps_freq<f>: the number of ticks per second with a truck every f ticks per source, for several truck densities
+    - datacollector: the time the agent DataCollector takes per tick
+    - get_delay_time: the number of Bridge.get_delay_time calls per second over the broken bridges
+    - sweep: the wall time of a small end-to-end scenario x seed sweep (run_batch, as model_run.py does),
+      in this process
+    - sweep_parallel: the same sweep over a pool of worker processes, with the network in shared memory
+
+    Every benchmark is repeated and the best time is kept, which is the least disturbed by the rest
+    of the machine. The results are compared with a baseline stored in benchmark_baseline.json (made
+    on the first run, or with --save), and a benchmark that is more than --tolerance worse than the
+    baseline is reported as a regression (and the exit code is 1).
+
+    Timings are only comparable on the same machine, so there is no shared baseline: every machine
+    makes its own, from the code the change is compared with. To check a change:
+
+        $ git stash                      # or check out the commit before the change
+        $ python benchmark.py --save     # store the results of the old code as the baseline
+        $ git stash pop
+        $ python benchmark.py            # run the new code and compare with the baseline
+
+    A baseline of a machine that always runs the benchmarks (e.g. a build server) can be kept
+    elsewhere, even under version control, and used with --baseline <path>.
+"""
+
+# the seed and scenario of all benchmarks
+seed = 1234567
+scenario = 4
+
+# the generation frequencies (ticks between two trucks per source) of the stepping benchmarks
+generation_frequencies = (20, 5, 1)
+
+# the number of worker processes of the parallel sweep
+parallel_workers = min(4, os.cpu_count() or 1)
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+# ---------------------------------------------------------------
+def best_time(function, repeat):
+    """
+    The shortest wall time of `repeat` calls of function()
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def result(value, unit, higher_is_better=False):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def bench_build(repeat):
+    # the first model loads the network into the process; the benchmark measures the models after it
+    BangladeshModel(seed=seed, scenario=scenario, trip_log=True)
+    seconds = best_time(lambda: BangladeshModel(seed=seed, scenario=scenario, trip_log=True), repeat)
+    return result(seconds * 1000, 'ms')
+
+
+def bench_steps(generation_frequency, ticks, repeat):
+    def run():
+        model = BangladeshModel(seed=seed, scenario=scenario, trip_log=True)
+        for _ in range(ticks):
+            model.step()
+
+    default_frequency = Source.generation_frequency
+    Source.generation_frequency = generation_frequency
+    try:
+        build_seconds = best_time(lambda: BangladeshModel(seed=seed, scenario=scenario, trip_log=True), repeat)
+        seconds = best_time(run, repeat) - build_seconds
+    finally:
+        Source.generation_frequency = default_frequency
+    return result(ticks / seconds, 'ticks/s', higher_is_better=True)
+
+
+def bench_datacollector(ticks, repeat):
+    def run():
+        model = BangladeshModel(seed=seed, scenario=scenario)
+        collect_seconds = 0.0
+        for _ in range(ticks):
+            model.schedule.step()
+            start = time.perf_counter()
+            model.collect()
+            collect_seconds += time.perf_counter() - start
+        return collect_seconds
+
+    return result(min(run() for _ in range(repeat)) / ticks * 1000, 'ms/tick')
+
+
+def bench_get_delay_time(ticks, repeat):
+    model = BangladeshModel(seed=seed, scenario=scenario, trip_log=True)
+    bridges = [agent for agent in model.infra if isinstance(agent, Bridge) and agent.delay_time != 0]
+
+    def run():
+        # every tick the delays are drawn for the first call, the other calls in the tick are cached
+        for tick in range(ticks):
+            model.schedule.steps = tick
+            for bridge in bridges:
+                bridge.get_delay_time()
+                bridge.get_delay_time()
+
+    seconds = best_time(run, repeat)
+    return result(2 * ticks * len(bridges) / seconds, 'calls/s', higher_is_better=True)
+
+
+def bench_sweep(run_length, workers, repeat):
+    def run():
+        with tempfile.TemporaryDirectory() as output_dir, open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            run_batch([0, 4, 8], [seed, seed + 1], run_length, output_dir=output_dir, workers=workers)
+
+    return result(best_time(run, repeat), 's')
+
+
+# ---------------------------------------------------------------
+def run_benchmarks(quick=False):
+    """
+    Run all benchmarks; returns a dict name -> {value, unit, higher_is_better}
+
+    quick: bool
+        fewer ticks and repeats, to check that the suite runs rather than to measure
+    """
+    repeat = 1 if quick else 3
+    ticks = 500 if quick else 2000
+    results = {'build': bench_build(repeat)}
+    for generation_frequency in generation_frequencies:
+        results[f'steps_freq{generation_frequency}'] = bench_steps(generation_frequency, ticks, repeat)
+    results['datacollector'] = bench_datacollector(ticks, repeat)
+    results['get_delay_time'] = bench_get_delay_time(ticks, repeat)
+    results['sweep'] = bench_sweep(ticks, 1, repeat)
+    results['sweep_parallel'] = bench_sweep(ticks, parallel_workers, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Print the results next to the baseline; returns the names of the benchmarks that are more
+    than `tolerance` (a fraction) worse than the baseline
+    """
+    regressions = []
+    print(f"{'benchmark':<18}{'result':>14}{'baseline':>14}  {'unit':<9}{'change':>9}")
+    for name, current in results.items():
+        line = f"{name:<18}{current['value']:>14.4g}"
+        if name in baseline:
+            before = baseline[name]['value']
+            # the relative change, positive is better
+            change = current['value'] / before - 1 if current['higher_is_better'] else before / current['value'] - 1
+            status = ''
+            if change < -tolerance:
+                status = '  REGRESSION'
+                regressions.append(name)
+            line += f"{before:>14.4g}  {current['unit']:<9}{change:>+9.1%}{status}"
+        else:
+            line += f"{'-':>14}  {current['unit']:<9}"
+        print(line)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the model against a stored baseline")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--quick', action='store_true', help="fewer ticks and repeats")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="the fraction a benchmark may be worse than the baseline (default 0.2)")
+    parser.add_argument('--baseline', default=baseline_path,
+                        help="the baseline file to compare with or save to (default benchmark_baseline.json)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(quick=args.quick)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored['results']
+        if stored['quick'] != args.quick:
+            print("warning: the baseline was made with" + ("" if stored['quick'] else "out"), "--quick")
+        if stored.get('cpu_count') != os.cpu_count():
+            print("warning: the baseline was made on a machine with", stored.get('cpu_count'), "cores")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save or not baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'cpu_count': os.cpu_count(), 'quick': args.quick, 'results': results}, f, indent=2)
+        print("baseline saved to", args.baseline)
+    elif regressions:
+        print(len(regressions), "regression(s):", ', '.join(regressions))
+        sys.exit(1)
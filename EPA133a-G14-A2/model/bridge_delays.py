@@ -0,0 +1,115 @@
+import numpy as np
+
+"""
+    Vectorized delay times of the broken bridges
+
+    The delays of all bridges of a tick are drawn at once, in one vectorized NumPy call,
+    the first time a delay of that tick is asked for, and cached for the rest of the tick.
+
+    The random numbers come from a counter-based generator (Philox): the numbers of tick t are
+    always the t-th block of one stream that only depends on the key. So the delay of a bridge
+    at a tick is the same no matter which agents (vehicles, the DataCollector, ...) ask for
+    delays, how often, or at which other ticks.
+    Every bridge of the network has its own place in the numbers of a tick, its delay index, also
+    when it is intact. So the delays of a bridge do not depend on which other bridges are broken,
+    and the scenarios of a seed delay a bridge that is broken in all of them by the same times.
+"""
+
+
+# ---------------------------------------------------------------
+def delay_distribution(length):
+    """
+    The delay time distribution (in minutes) of a broken bridge given its length in meters:
+    (kind, low, high, mode) with kind 'uniform' or 'triangular'
+    """
+    if length <= 10:
+        return 'uniform', 10, 20, None
+    elif length <= 50:
+        return 'uniform', 15, 60, None
+    elif length <= 200:
+        return 'uniform', 45, 90, None
+    else:
+        return 'triangular', 60, 240, 120
+
+
+class BridgeDelays:
+    """
+    Draws and caches the delay times of all bridges, per tick
+
+    Attributes
+    __________
+    size: int
+        the number of bridges of the network; a bridge is identified by its delay index 0 .. size - 1,
+        its position among the bridges of the network
+
+    block: int
+        the number of random numbers used per tick (size rounded up to a whole number of Philox blocks)
+    """
+
+    def __init__(self, key, lengths):
+        """
+        key: int
+            the Philox key of the random stream, e.g. RandomStreams.key(RandomStreams.DELAYS)
+        lengths: list
+            the lengths of all bridges of the network, by delay index
+        """
+        self.key = key
+        self.size = len(lengths)
+        # Philox produces its numbers in blocks of 4; whole blocks per tick make every tick start a new block
+        self.block = 4 * -(-self.size // 4)
+        distributions = [delay_distribution(length) for length in lengths]
+        self.triangular = np.array([kind == 'triangular' for kind, low, high, mode in distributions], dtype=bool)
+        self.low = np.array([low for kind, low, high, mode in distributions], dtype=float)
+        self.high = np.array([high for kind, low, high, mode in distributions], dtype=float)
+        self.mode = np.array([low if mode is None else mode for kind, low, high, mode in distributions], dtype=float)
+        self._generator = None
+        self._tick = None
+        self._delays = None
+
+    def _new_generator(self):
+        return np.random.Generator(np.random.Philox(key=self.key))
+
+    def transform(self, uniforms):
+        """
+        Turn uniform(0, 1) numbers into delay times, per bridge (along the last axis)
+        """
+        delays = self.low + (self.high - self.low) * uniforms
+        if self.triangular.any():
+            # inverse of the cumulative distribution function of the triangular distribution
+            low, high, mode = self.low[self.triangular], self.high[self.triangular], self.mode[self.triangular]
+            u = uniforms[..., self.triangular]
+            split = (mode - low) / (high - low)
+            delays[..., self.triangular] = np.where(u < split,
+                                                    low + np.sqrt(u * (high - low) * (mode - low)),
+                                                    high - np.sqrt((1 - u) * (high - low) * (high - mode)))
+        return delays
+
+    def at_tick(self, tick):
+        """
+        The delay times of all bridges at the given tick
+        """
+        if tick != self._tick:
+            if self._generator is None or self._tick is None or tick < self._tick:
+                self._generator = self._new_generator()
+                skip = tick
+            else:
+                skip = tick - self._tick - 1
+            if skip:
+                self._generator.bit_generator.advance(skip * self.block // 4)
+            uniforms = self._generator.random(self.block)[:self.size]
+            self._delays = self.transform(uniforms)
+            self._tick = tick
+        return self._delays
+
+    def delay(self, index, tick):
+        """
+        The delay time of bridge `index` at the given tick
+        """
+        return float(self.at_tick(tick)[index])
+
+    def table(self, run_length):
+        """
+        The delay times of all bridges for ticks 0 .. run_length - 1, as a (run_length, size) array
+        """
+        uniforms = self._new_generator().random(run_length * self.block).reshape(run_length, self.block)
+        return self.transform(uniforms[:, :self.size])
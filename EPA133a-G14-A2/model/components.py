@@ -1,7 +1,7 @@
+import math
 from mesa import Agent
 from enum import Enum
-import numpy as np
-import random
+from random_streams import RandomStreams
 
 
 # ---------------------------------------------------------------
@@ -48,142 +48,36 @@ class Bridge(Infra):
         condition of the bridge
 
     delay_time: int
-        the delay (in ticks) caused by this bridge
+        the delay (in ticks) caused by this bridge; the model creates a broken bridge
+        with delay_time 1 and an intact one with delay_time 0 (see scenarios.py)
+
+    delay_index: int
+        the position of this bridge among the bridges of the network, its index in the model's
+        BridgeDelays, if it is broken; None otherwise
     ...
 
     """
 
     def __init__(self, unique_id, model, length=0,
-                 name='Unknown', road_name='Unknown', condition='Unknown', scenario=0, delay_time=0, seed=None):
+                 name='Unknown', road_name='Unknown', condition='Unknown', scenario=0, delay_time=0):
         super().__init__(unique_id, model, length, name, road_name)
 
         self.condition = condition
         self.scenario = scenario
         self.delay_time = delay_time
-        self.seed = seed
-        extra_seed = unique_id
-        seed = self.seed + extra_seed
-        random.seed(seed)
-        # this will be a random number from 1 to 100, it will help
-        # determine if a bridge is broken
-        broken_roll = random.randrange(1, 101)
-        # this will be 0 or 1, meaning there will be a delay or not
-        possible_delay_time = 1
-
-        # Check the scenario, if the scenario is 0, there is no delay time
-        if scenario == 0:
-            self.delay_time = 0
-
-        # If the scenario is 1, there is a possibility of a delay if the condition is D and the broken roll
-        # is less than 5
-        if scenario == 1:
-            if condition == 'A' or condition == 'B' or condition == 'C':
-                self.delay_time = 0
-            elif condition == 'D' and broken_roll <= 5:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-        # If the scenario is 2, there is a possibility of a delay if the condition is D and the broken roll
-        # is less than 10
-        if scenario == 2:
-            if condition == 'A' or condition == 'B' or condition == 'C':
-                self.delay_time = 0
-            elif condition == 'D' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-        # If the scenario is 3, there is a possibility of a delay if the condition is C and the broken roll
-        # is less than 5, or the condition is D and the broken roll is less than 10
-        if scenario == 3:
-            if condition == 'A' or condition == 'B':
-                self.delay_time = 0
-            elif condition == 'C' and broken_roll <= 5:
-                self.delay_time = possible_delay_time
-            elif condition == 'D' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-        # If the scenario is 4, there is a possibility of a delay if the condition is C and the broken roll
-        # is less than 10, or the condition is D and the broken_roll is 20
-        if scenario == 4:
-            if condition == 'A' or condition == 'B':
-                self.delay_time = 0
-            elif condition == 'C' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            elif condition == 'D' and broken_roll <= 20:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-
-        # If the scenario is 5, the possibility of a delay if the condition is 5, there is a possibility of a delay
-        # if the condition is B and the broken roll is less than 5, or, if the condition is C,
-        if scenario == 5:
-            if condition == 'A':
-                self.delay_time = 0
-            elif condition == 'B' and broken_roll <= 5:
-                self.delay_time = possible_delay_time
-            elif condition == 'C' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            elif condition == 'D' and broken_roll <= 20:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-
-        # All the other scenarios are determined in a similar way.
-        if scenario == 6:
-            if condition == 'A':
-                self.delay_time = 0
-            elif condition == 'B' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            elif condition == 'C' and broken_roll <= 20:
-                self.delay_time = possible_delay_time
-            elif condition == 'D' and broken_roll <= 40:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-
-        if scenario == 7:
-            if condition == 'A' and broken_roll <= 5:
-                self.delay_time = possible_delay_time
-            elif condition == 'B' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            elif condition == 'C' and broken_roll <= 20:
-                self.delay_time = possible_delay_time
-            elif condition == 'D' and broken_roll <= 40:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
-
-        if scenario == 8:
-            if condition == 'A' and broken_roll <= 10:
-                self.delay_time = possible_delay_time
-            elif condition == 'B' and broken_roll <= 20:
-                self.delay_time = possible_delay_time
-            elif condition == 'C' and broken_roll <= 40:
-                self.delay_time = possible_delay_time
-            elif condition == 'D' and broken_roll <= 80:
-                self.delay_time = possible_delay_time
-            else:
-                self.delay_time = 0
+        self.delay_index = None
 
     def get_delay_time(self):
-        # import main seed for model_run and add the current step to it so the delay
-        # each step is different, but deterministic
-        extra_seed = self.model.schedule.steps
-        # from model_run import seed
-        seed = self.seed + extra_seed
-        np.random.seed(seed)
-        # Check length of the bridges and calculate the unique delay time at the bridge if it is broken
+        """
+        The delay time of this bridge at the current tick
+
+        The delays of all broken bridges are drawn at once per tick by the model's BridgeDelays,
+        so asking again in the same tick (e.g. by the DataCollector) gives the same delay
+        """
+        # Check if the bridge is broken and look up its unique delay time at this tick
         if self.delay_time == 0:
-            self.delay_time = 0
-        elif self.length <= 10:
-            self.delay_time = random.uniform(10, 20)
-        elif self.length <= 50:
-            self.delay_time = random.uniform(15, 60)
-        elif self.length <= 200:
-            self.delay_time = random.uniform(45, 90)
-        else:
-            self.delay_time = random.triangular(60, 240, 120)
+            return 0
+        self.delay_time = self.model.bridge_delays.delay(self.delay_index, self.model.schedule.steps)
         return self.delay_time
 
 
@@ -192,6 +86,14 @@ class Link(Infra):
     pass
 
 
+# ---------------------------------------------------------------
+class Intersection(Infra):
+    """
+    A component shared by several roads, where the roads are joined
+    """
+    pass
+
+
 # ---------------------------------------------------------------
 class Sink(Infra):
     """
@@ -210,19 +112,42 @@ class Sink(Infra):
     vehicle_removed_driving_time = []
     tick_removing = 0
 
+    def __init__(self, unique_id, model, length=0,
+                 name='Unknown', road_name='Unknown'):
+        super().__init__(unique_id, model, length, name, road_name)
+        # every sink gets its own list, instead of appending to the class attribute shared by all sinks
+        self.vehicle_removed_driving_time = []
+
     def step(self):
         if self.tick_removing < self.model.schedule.steps:
             self.vehicle_removed_driving_time = []
 
     def remove(self, vehicle):
+        if self.tick_removing < self.model.schedule.steps:
+            # the first vehicle removed in this tick starts a new list, also when the sink was not stepped
+            # in this tick, so the lists collected in earlier ticks are never changed
+            self.vehicle_removed_driving_time = []
         # update the tick we are removing at
         self.tick_removing = self.model.schedule.steps
 
         # append the truck to the list of vehicles this sink removes at this tick
-        self.vehicle_removed_driving_time.append([vehicle.unique_id, vehicle.removed_at_step-vehicle.generated_at_step])
+        self.vehicle_removed_driving_time.append(['Truck' + str(vehicle.number), vehicle.removed_at_step-vehicle.generated_at_step])
+
+        if self.model.trip_log is not None:
+            self.model.trip_log.record(vehicle.number, vehicle.generated_by.unique_id, self.unique_id,
+                                       vehicle.generated_at_step, vehicle.removed_at_step, vehicle.delay)
+
+        if self.model.trip_stats is not None:
+            self.model.trip_stats.record(vehicle.generated_by.unique_id, self.unique_id,
+                                         vehicle.removed_at_step - vehicle.generated_at_step, vehicle.delay)
+
+        if self.model.steady_state is not None:
+            self.model.steady_state.record(vehicle.removed_at_step - vehicle.generated_at_step,
+                                           vehicle.removed_at_step)
 
         self.model.schedule.remove(vehicle)
         self.vehicle_removed_toggle = not self.vehicle_removed_toggle
+        vehicle.release()
 
 
 # ---------------------------------------------------------------
@@ -231,11 +156,6 @@ class Source(Infra):
     """
     Source generates vehicles
 
-    Class Attributes:
-    -----------------
-    truck_counter : int
-        the number of trucks generated by ALL sources. Used as Truck ID!
-
     Attributes
     __________
     generation_frequency: int
@@ -243,14 +163,20 @@ class Source(Infra):
 
     vehicle_generated_flag: bool
         True when a Truck is generated in this tick; False otherwise
+
+    rng: Generator
+        the source's own random stream, used to pick the destinations of its trucks
     ...
 
     """
 
-    truck_counter = 0
     generation_frequency = 5
     vehicle_generated_flag = False
-    print(truck_counter)
+
+    def __init__(self, unique_id, model, length=0,
+                 name='Unknown', road_name='Unknown'):
+        super().__init__(unique_id, model, length, name, road_name)
+        self.rng = model.streams.generator(RandomStreams.SOURCE, unique_id)
 
     def step(self):
         if self.model.schedule.steps % self.generation_frequency == 0:
@@ -264,11 +190,12 @@ class Source(Infra):
         """
 
         try:
-            agent = Vehicle('Truck' + str(Source.truck_counter), self.model, self)
+            number = self.model.truck_counter
+            agent = Vehicle.create(self.model, self, number)
             if agent:
                 self.model.schedule.add(agent)
                 agent.set_path()
-                Source.truck_counter += 1
+                self.model.truck_counter += 1
                 self.vehicle_count += 1
                 self.vehicle_generated_flag = True
         except Exception as e:
@@ -294,11 +221,20 @@ class SourceSink(Source, Sink):
 
 
 # ---------------------------------------------------------------
-class Vehicle(Agent):
+class Vehicle:
     """
+    A truck driving from its source to its sink
+
+    Vehicles are not Mesa Agents: they only have the attributes below (__slots__, without a
+    __dict__), which is all the scheduler needs. A vehicle that is removed by a sink is put in the
+    pool of the model (model.vehicle_pool), and a new vehicle reuses an object from the pool when
+    there is one, so a long run does not allocate an object per truck.
 
     Attributes
     __________
+    unique_id: int
+        -(number + 1); negative, so that it never equals the id of an infrastructure component
+
     speed: float
         speed in meter per minute (m/min)
 
@@ -317,13 +253,24 @@ class Vehicle(Agent):
         the Infra, which has a certain length
         i.e. location_offset < length
 
-    path_ids: Series
+    entry_offset: float
+        the location offset at which the vehicle entered its current location
+
+    driven_ticks: int
+        the number of ticks the vehicle has driven along its current location; the location offset
+        is always offset_after(driven_ticks), so the offset after any number of ticks can be
+        computed at once, exactly as driving tick by tick gives it
+
+    route: int
+        the route id (in the model's route_table) of the path where the vehicle shall drive
+
+    path: array int
         the whole path (origin and destination) where the vehicle shall drive
-        It consists the Infras' uniques IDs in a sequential order
+        It consists the Infras' indices (in model.infra) in a sequential order
 
     location_index: int
-        a pointer to the current Infra in "path_ids" (above)
-        i.e. the id of self.location is self.path_ids[self.location_index]
+        a pointer to the current Infra in "path" (above)
+        i.e. self.location is model.infra[self.path[self.location_index]]
 
     waiting_time: int
         the time the vehicle needs to wait
@@ -333,6 +280,12 @@ class Vehicle(Agent):
 
     removed_at_step: int
         the timestamp (number of ticks) that the vehicle is removed
+
+    number: int
+        the truck number, counted per model; the truck is 'Truck' + str(number) in the output
+
+    delay: float
+        the total delay time the vehicle got at the bridges on its path
     ...
 
     """
@@ -346,24 +299,63 @@ class Vehicle(Agent):
         DRIVE = 1
         WAIT = 2
 
-    def __init__(self, unique_id, model, generated_by,
-                 location_offset=0, path_ids=None):
-        super().__init__(unique_id, model)
+    __slots__ = ('unique_id', 'model', 'pos', 'generated_by', 'generated_at_step', 'location', 'location_offset',
+                 'entry_offset', 'driven_ticks', 'route', 'path', 'state', 'location_index', 'waiting_time', 'waited_at', 'removed_at_step',
+                 'number', 'delay',
+                 # the activation order of the vehicle in the EventScheduler
+                 'activation_order',
+                 # the last tick whose step the state of the vehicle includes, in the FastForwardScheduler
+                 'synced_at')
+
+    def __init__(self, model, generated_by, number, location_offset=0, route=None):
+        self.model = model
+        self.reset(generated_by, number, location_offset, route)
+
+    @classmethod
+    def create(cls, model, generated_by, number):
+        """
+        A new vehicle: an object from the pool of the model if there is one, else a new object
+        """
+        if model.vehicle_pool:
+            vehicle = model.vehicle_pool.pop()
+            vehicle.reset(generated_by, number)
+            return vehicle
+        return cls(model, generated_by, number)
+
+    def release(self):
+        """
+        Put the vehicle in the pool of the model, once it is removed, so its object can be reused
+        """
+        self.model.vehicle_pool.append(self)
+
+    def reset(self, generated_by, number, location_offset=0, route=None):
+        """
+        (Re)initialize all attributes for a vehicle generated now by generated_by
+        """
+        model = self.model
+        self.unique_id = -(number + 1)
         self.generated_by = generated_by
         self.generated_at_step = model.schedule.steps
         self.location = generated_by
         self.location_offset = location_offset
+        self.entry_offset = location_offset
+        self.driven_ticks = 0
         self.pos = generated_by.pos
-        self.path_ids = path_ids
+        self.route = route
+        self.path = None if route is None else model.route_table.paths[route]
         # default values
         self.state = Vehicle.State.DRIVE
         self.location_index = 0
         self.waiting_time = 0
         self.waited_at = None
         self.removed_at_step = None
+        self.number = number
+        self.delay = 0
+        self.activation_order = None
+        self.synced_at = None
 
     def __str__(self):
-        return "Vehicle" + str(self.unique_id) + \
+        return "VehicleTruck" + str(self.number) + \
                " +" + str(self.generated_at_step) + " -" + str(self.removed_at_step) + \
                " " + str(self.state) + '(' + str(self.waiting_time) + ') ' + \
                str(self.location) + '(' + str(self.location.vehicle_count) + ') ' + str(self.location_offset)
@@ -372,7 +364,8 @@ class Vehicle(Agent):
         """
         Set the origin destination path of the vehicle
         """
-        self.path_ids = self.model.get_random_route(self.generated_by.unique_id)
+        self.route = self.model.get_random_route(self.generated_by.unique_id)
+        self.path = self.model.route_table.paths[self.route]
 
     def step(self):
         """
@@ -391,19 +384,72 @@ class Vehicle(Agent):
         To print the vehicle trajectory at each step
         """
 
-    def drive(self):
-
+    def offset_after(self, ticks):
+        """
+        The location offset after driving the given number of ticks along the current location
+        """
         # the distance that vehicle drives in a tick
         # speed is global now: can change to instance object when individual speed is needed
+        return self.entry_offset + ticks * (Vehicle.speed * Vehicle.step_time)
+
+    def idle_ticks(self):
+        """
+        The number of ticks, from the next tick on, in which step() would only count down the waiting
+        time or move the vehicle along its location, without reaching the next component
+        """
+        if self.state == Vehicle.State.WAIT:
+            # the vehicle drives again in the tick its waiting time reaches 0
+            return math.ceil(self.waiting_time) - 1
+        length = self.location.length
+        entry_offset = self.entry_offset
+        driven_ticks = self.driven_ticks
         distance = Vehicle.speed * Vehicle.step_time
-        distance_rest = self.location_offset + distance - self.location.length
+        if entry_offset + (driven_ticks + 1) * distance - length > 0:
+            # reaches the next component in the next tick (on short components, the common case)
+            return 0
+        # the last tick count on this location, from the remaining distance and the speed; the
+        # division can be off by one at the boundary, so it is checked with the same arithmetic as
+        # drive() (see offset_after), which only ever moves it by a tick
+        ticks = math.floor((length - entry_offset) / distance)
+        if ticks <= driven_ticks:
+            ticks = driven_ticks + 1
+        while entry_offset + (ticks + 1) * distance - length <= 0:
+            ticks += 1
+        while ticks > driven_ticks and entry_offset + ticks * distance - length > 0:
+            ticks -= 1
+        return ticks - driven_ticks
+
+    def skip(self, ticks):
+        """
+        Do the steps of the given number of idle ticks (see idle_ticks) at once
+
+        The vehicle continues from exactly the same state as after stepping tick by tick: the offset
+        is computed in the same way as drive() does, and taking 1 off the waiting time is exact, so
+        taking off `ticks` at once gives the same waiting time
+        """
+        if ticks == 0:
+            return
+        if self.state == Vehicle.State.WAIT:
+            self.waiting_time = max(self.waiting_time - ticks, 0)
+        else:
+            self.driven_ticks += ticks
+            self.location_offset = self.entry_offset + self.driven_ticks * (Vehicle.speed * Vehicle.step_time)
+
+    def drive(self):
+
+        # the offset after one more tick on this location, computed as in offset_after (inlined, as
+        # drive runs for every driving vehicle every tick)
+        ticks = self.driven_ticks + 1
+        offset = self.entry_offset + ticks * (Vehicle.speed * Vehicle.step_time)
+        distance_rest = offset - self.location.length
 
         if distance_rest > 0:
             # go to the next object
             self.drive_to_next(distance_rest)
         else:
             # remain on the same object
-            self.location_offset += distance
+            self.driven_ticks = ticks
+            self.location_offset = offset
 
     def drive_to_next(self, distance):
         """
@@ -411,8 +457,7 @@ class Vehicle(Agent):
         """
 
         self.location_index += 1
-        next_id = self.path_ids[self.location_index]
-        next_infra = self.model.schedule._agents[next_id]  # Access to protected member _agents
+        next_infra = self.model.infra[self.path[self.location_index]]
 
         if isinstance(next_infra, Sink):
             # arrive at the sink
@@ -423,6 +468,9 @@ class Vehicle(Agent):
         elif isinstance(next_infra, Bridge):
             self.waiting_time = next_infra.get_delay_time()
             if self.waiting_time > 0:
+                self.delay += self.waiting_time
+                if self.model.trip_stats is not None:
+                    self.model.trip_stats.record_delay(next_infra.unique_id, self.waiting_time)
                 # arrive at the bridge and wait
                 self.arrive_at_next(next_infra, 0)
                 self.state = Vehicle.State.WAIT
@@ -443,6 +491,8 @@ class Vehicle(Agent):
         self.location.vehicle_count -= 1
         self.location = next_infra
         self.location_offset = location_offset
+        self.entry_offset = location_offset
+        self.driven_ticks = 0
         self.location.vehicle_count += 1
 
 # EOF -----------------------------------------------------------
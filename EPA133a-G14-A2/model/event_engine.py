@@ -0,0 +1,153 @@
+import heapq
+import math
+
+from mesa.time import BaseScheduler
+
+from model import BangladeshModel
+from components import Source, Vehicle
+
+"""
+    Discrete-event engine for BangladeshModel
+
+    Instead of calling step() on every agent every tick, the EventScheduler keeps a heap of
+    next-event times. An agent is only activated at the ticks at which something happens to it:
+    - a Source at its generation ticks
+    - a Vehicle at the tick it drives into the next infrastructure component, or at the tick
+      it is done waiting at a bridge
+    Between those ticks a driving vehicle only moves along the component it is on, which does
+    not have to be simulated tick by tick. The infrastructure agents have no behaviour of their
+    own and are never activated.
+
+    The same components (Vehicle.drive, Bridge.get_delay_time, Sink.remove) are used as in the
+    tick-based model, so a run gives the same trips.
+"""
+
+
+# ---------------------------------------------------------------
+class EventScheduler(BaseScheduler):
+    """
+    Scheduler that activates agents at their next event tick only
+
+    Within a tick, the sources are activated first and then the vehicles, each in the
+    order they were added, just like BaseScheduler does.
+
+    Attributes
+    __________
+    events: list
+        heap of (tick, kind, order, agent); kind is 0 for sources and 1 for vehicles,
+        order is the number of agents that were added before the agent
+    """
+
+    SOURCE = 0
+    VEHICLE = 1
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.events = []
+        self.added = 0
+
+    def add(self, agent):
+        super().add(agent)
+        agent.activation_order = self.added
+        self.added += 1
+        if isinstance(agent, Source):
+            # the first generation tick from now on
+            frequency = agent.generation_frequency
+            tick = -(-self.steps // frequency) * frequency
+            self.push(tick, EventScheduler.SOURCE, agent)
+        elif isinstance(agent, Vehicle):
+            # a vehicle is not activated in the tick it is generated, so it drives for the first time next tick
+            self.schedule_drive(agent, self.steps)
+
+    def push(self, tick, kind, agent):
+        heapq.heappush(self.events, (tick, kind, agent.activation_order, agent))
+
+    def schedule_drive(self, vehicle, tick):
+        """
+        Schedule the vehicle at the tick it drives past the end of its current location
+
+        tick is the last tick that vehicle.location_offset is valid for. The ticks before the crossing
+        are counted with Vehicle.idle_ticks and the vehicle is moved on over them with Vehicle.skip,
+        as the FastForwardScheduler does, so it continues from exactly the offset driving tick by tick gives.
+        """
+        idle_ticks = vehicle.idle_ticks()
+        if idle_ticks:
+            vehicle.skip(idle_ticks)
+        self.push(tick + 1 + idle_ticks, EventScheduler.VEHICLE, vehicle)
+
+    def activate(self, kind, agent):
+        """
+        Handle the event of an agent at the current tick, and schedule its next event
+        """
+        if kind == EventScheduler.SOURCE:
+            agent.step()
+            self.push(self.steps + agent.generation_frequency, kind, agent)
+            return
+
+        vehicle = agent
+        if vehicle.state == Vehicle.State.WAIT:
+            # done waiting, drive on in this tick
+            vehicle.waiting_time = 0
+            vehicle.waited_at = vehicle.location
+            vehicle.state = Vehicle.State.DRIVE
+        vehicle.drive()
+
+        if vehicle.removed_at_step is not None:
+            return
+        if vehicle.state == Vehicle.State.WAIT:
+            # the waiting time goes down by one every tick; the vehicle drives again in the tick it reaches 0
+            self.push(self.steps + math.ceil(vehicle.waiting_time), kind, vehicle)
+        else:
+            self.schedule_drive(vehicle, self.steps)
+
+    def step(self):
+        """
+        Handle all events of the current tick
+        """
+        while self.events and self.events[0][0] == self.steps:
+            tick, kind, order, agent = heapq.heappop(self.events)
+            self.activate(kind, agent)
+        self.steps += 1
+        self.time += 1
+
+    def run(self, until):
+        """
+        Jump from event to event and handle all events before tick `until`
+        """
+        while self.events and self.events[0][0] < until:
+            if self.events[0][0] > self.steps:
+                # all ticks before the next event are done; stop there if the model has converged
+                self.steps = self.time = self.events[0][0]
+                self.model.check_steady_state()
+                if not self.model.running:
+                    self.steps = self.time = self.model.steady_state.stopped_at
+                    return
+            tick, kind, order, agent = heapq.heappop(self.events)
+            self.steps = self.time = tick
+            self.activate(kind, agent)
+            self.model.collect_trips()
+        self.steps = self.time = until
+
+
+# ---------------------------------------------------------------
+class EventDrivenModel(BangladeshModel):
+    """
+    BangladeshModel driven by the EventScheduler
+
+    The trips are recorded in the trip log (model.trip_log); the per-tick DataCollector is
+    not used. Use run(run_length) to simulate a whole run at once; step() still advances the
+    model by a single tick.
+    """
+
+    schedule_class = EventScheduler
+
+    def __init__(self, seed, scenario, x_max=500, y_max=500, x_min=0, y_min=0, **kwargs):
+        # the trips are always recorded in the trip log, also when the caller passes trip_log
+        kwargs['trip_log'] = True
+        super().__init__(seed, scenario, x_max, y_max, x_min, y_min, **kwargs)
+
+    def run(self, run_length):
+        """
+        Advance the simulation up to tick run_length
+        """
+        self.schedule.run(run_length)
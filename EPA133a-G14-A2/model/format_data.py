@@ -1,37 +1,80 @@
+import os
+
 import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401 (needed by pandas for feather files)
+    cache_format = 'feather'
+except ImportError:
+    cache_format = 'pickle'
+
 # To help with printing/debugging
 pd.set_option('display.width', 320)
 pd.set_option('display.max_columns', 10)
 
+"""
+    Preprocessing of the BMMS bridge data and the road data into network files for the model
+
+    All roads are processed in one pass, with vectorized operations per road, and every road is
+    written to its own network file, e.g. ../data/N1.csv. The Excel and csv inputs are cached in
+    a columnar file (feather, or pickle if pyarrow is not installed) next to them after the first
+    read, so later runs do not parse the Excel file again.
+"""
+
+# the end of a road is the LRP with this name (by default 'End of Road')
+road_end_names = {
+    'N1': 'Chittagong city area ends and the survey of N1 starts again',
+}
+
+
+def cached_read(file_path, read):
+    """
+    Read a data file with read(file_path), through a columnar cache file next to it
 
-def extract_data():
+    The cache file is made on the first read and used as long as it is newer than the data file
+    """
+    cache_path = os.path.splitext(file_path)[0] + '.' + cache_format
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        if cache_format == 'feather':
+            return pd.read_feather(cache_path)
+        return pd.read_pickle(cache_path)
+
+    df = read(file_path)
+    if cache_format == 'feather':
+        df.to_feather(cache_path)
+    else:
+        df.to_pickle(cache_path)
+    return df
+
+
+def extract_data(roads=None):
     """
     Extracts the data from the Excel file and removes all unnecessary information, and returns a dataframe.
+
+    roads: list
+        the roads to keep; None keeps all roads
     """
-    # Assuming _roads3.csv is in the current directory
     file_path = "../data/BMMS_overview.xlsx"
-    # Read the CSV file into a DataFrame
-    df_read = pd.read_excel(file_path, header=0)  # header=0 means use the first row as column names
-    # Select all rows where the column "road" is equal to "N1"
-    bridge_df = df_read[df_read['road'] == 'N1']
+    # header=0 means use the first row as column names
+    df_read = cached_read(file_path, lambda path: pd.read_excel(path, header=0))
+    bridge_df = df_read if roads is None else df_read[df_read['road'].isin(roads)]
     # List of column names to remove
     columns_to_remove = ['type', 'roadName', 'structureNr', 'width', 'constructionYear', 'spans', 'zone',
                          'circle', 'division', 'sub-division', 'EstimatedLoc']
     # Drop the specified columns
     bridge_df = bridge_df.drop(columns=columns_to_remove)
 
-    bridge_df = bridge_df[bridge_df['chainage'] <= 241.063]
-
     return bridge_df
 
 
 def sort_and_remove_duplicates(df):
     """
-    This method sorts the dataframe based on the chainage, and then removes any duplicates from those columns
+    This method sorts the dataframe based on the road and the chainage, and then removes any duplicates
+    from those columns, per road
     """
-    ordered_df = df.sort_values(by='chainage')
+    # sort every road on its own, so that the duplicates a road keeps do not depend on the other roads
+    ordered_df = pd.concat([road_df.sort_values(by='chainage') for _, road_df in df.groupby('road')])
     # Define custom aggregation functions
     aggregations = {
         'condition': 'max',  # Keep the worst grade
@@ -44,17 +87,18 @@ def sort_and_remove_duplicates(df):
         'name': 'first'
     }
     # Apply groupby with custom aggregations
-    dropped_df = ordered_df.groupby('LRPName').agg(aggregations)
+    dropped_df = ordered_df.groupby(['road', 'LRPName']).agg(aggregations)
+    dropped_df.reset_index(drop=True, inplace=True)
     dropped_df['name'] = (dropped_df['name']
                           .str.lower()
                           .str.replace('r', 'l')
                           .str.replace(' ', '')
                           .str.replace('.', ''))
 
-    dropped_df = dropped_df.groupby('name').agg(aggregations)
+    dropped_df = dropped_df.groupby(['road', 'name']).agg(aggregations)
     dropped_df.reset_index(drop=True, inplace=True)
 
-    dropped_df = dropped_df.groupby('chainage').agg(aggregations)
+    dropped_df = dropped_df.groupby(['road', 'chainage']).agg(aggregations)
     dropped_df.reset_index(drop=True, inplace=True)
 
     dropped_df.drop(columns=['name'], inplace=True)
@@ -64,12 +108,12 @@ def sort_and_remove_duplicates(df):
 
 def add_modeltype_name(df):
     """
-    This method adds a modeltype of bridge, renames the LRPName to id, and adds a name for each bridge
+    This method adds a modeltype of bridge, and adds a name for each bridge, numbered per road
     """
     # Label all bridges as a bridge
     df['model_type'] = 'bridge'
-    # Add a column called 'name' filled with 'link' and a number from 1 to n
-    df['name'] = 'bridge ' + (df.index + 1).astype(str)
+    # Add a column called 'name' filled with 'bridge' and a number from 1 to n per road
+    df['name'] = 'bridge ' + (df.groupby('road').cumcount() + 1).astype(str)
     return df
 
 
@@ -84,17 +128,24 @@ def reorder_columns(df):
     return df
 
 
-def create_source_sink():
+def create_source_sink(roads=None):
     """
-    This method makes a source and a sink dataframe
+    This method makes a dataframe with the source and the sink of every road: its start and its end
     """
     # Read the CSV file into a DataFrame
-    df = pd.read_csv("../data/_roads3.csv", header=0)
-    # Select all rows where the column "road" is equal to "N1"
-    road_df = df[df['road'] == 'N1']
-    # add model types and names for the source and sink dataframes
-    start_end_road_df = (road_df[road_df['name'].str
-                         .startswith(('Start of Road', 'Chittagong city area ends and the survey of N1 starts again'))]
+    df = cached_read("../data/_roads3.csv", lambda path: pd.read_csv(path, header=0))
+    road_df = df if roads is None else df[df['road'].isin(roads)]
+    # the name of the LRP at the end of every row's road
+    end_names = road_df['road'].map(road_end_names).fillna('End of Road')
+    is_start = road_df['name'].astype(str).str.startswith('Start of Road')
+    is_end = np.array([name.startswith(end_name) for name, end_name in zip(road_df['name'].astype(str), end_names)])
+    start_end_road_df = road_df[is_start | is_end]
+    # only the first start and the first end of every road
+    start_end_road_df = (start_end_road_df
+                         .assign(is_start=is_start[is_start | is_end])
+                         .groupby(['road', 'is_start'], sort=False).head(1)
+                         .sort_values(by=['road', 'chainage'])
+                         .drop(columns=['is_start'])
                          .copy())
     start_end_road_df['model_type'] = 'sourcesink'
     start_end_road_df['name'] = 'sourcesink'
@@ -116,84 +167,125 @@ def format_source_sink(source_sink_df):
     return source_sink_df
 
 
-def add_links(df):
+def select_between_road_ends(bridge_df, source_sink_df):
     """
-    This method adds all the links inbetween the bridges, source, and sink. The length is determined by the
-    chainage of the next row, minus the chainage of the previous one.
+    This method drops the bridges that are not between the start and the end of their road
     """
-    new_dfs = []
-    for i in range(len(df) - 1):
-        row_before = df.iloc[i]
-        row_after = df.iloc[i + 1]
-        new_row = {
-            # put the link inbetween the two bridges
-            'chainage': row_before['chainage'] + (row_after['chainage'] - row_before['chainage']) / 2,
-            'road': row_before['road'],
-            'model_type': 'link',
-            'name': 'link ' + str(i+1),
-            # put the coordinates as averages of the two lats and lons
-            'lat': (row_before['lat'] + row_after['lat']) / 2,
-            'lon': (row_before['lon'] + row_after['lon']) / 2,
-            # make the length be the difference of the cahinages of its neighbors, and multiply by 1000 to convert km->m
-            # rounding is used to fix floating point rounding problems
-            'length': max(0, round((row_after['chainage'] - row_before['chainage']) * 1000, 2)),
-            'condition': np.NAN
-        }
-
-        new_dfs.append(pd.concat([pd.DataFrame([row_before]), pd.DataFrame([new_row])], ignore_index=True))
+    start_end = source_sink_df.groupby('road')['chainage'].agg(['min', 'max'])
+    chainage = bridge_df['chainage']
+    on_road = ((chainage >= bridge_df['road'].map(start_end['min'])) &
+               (chainage <= bridge_df['road'].map(start_end['max'])))
+    return bridge_df[on_road]
 
-    # Append the last row of the original DataFrame
-    new_dfs.append(pd.DataFrame([df.iloc[-1]]))
 
-    return pd.concat(new_dfs, ignore_index=True)
+def combine_road(bridges_df, source_sink_df):
+    """
+    This method puts the bridges of every road between the source at its start and the sink at its end
+    """
+    combined_df = pd.concat([source_sink_df, bridges_df])
+    # the source first and the sink last, the bridges by chainage in between
+    start = combined_df['road'].map(source_sink_df.groupby('road')['chainage'].min())
+    combined_df['order'] = np.where(combined_df['model_type'] == 'sourcesink',
+                                    np.where(combined_df['chainage'] == start, 0, 2), 1)
+    combined_df = combined_df.sort_values(by=['road', 'order', 'chainage'], kind='stable')
+    return combined_df.drop(columns=['order']).reset_index(drop=True)
 
 
-def remove_chainage_and_add_id(df):
+def add_links(df):
+    """
+    This method adds all the links inbetween the bridges, source, and sink of every road. The length is
+    determined by the chainage of the next row, minus the chainage of the previous one.
+    """
+    df = df.reset_index(drop=True)
+    position = df.groupby('road').cumcount()
+    row_after = df.groupby('road')[['chainage', 'lat', 'lon']].shift(-1)
+    has_next = row_after['chainage'].notna()
+
+    links = pd.DataFrame({
+        'road': df['road'][has_next],
+        'model_type': 'link',
+        'name': 'link ' + (position[has_next] + 1).astype(str),
+        # put the coordinates as averages of the two lats and lons
+        'lat': (df['lat'][has_next] + row_after['lat'][has_next]) / 2,
+        'lon': (df['lon'][has_next] + row_after['lon'][has_next]) / 2,
+        # make the length be the difference of the cahinages of its neighbors, and multiply by 1000 to convert km->m
+        # rounding is used to fix floating point rounding problems
+        'length': ((row_after['chainage'][has_next] - df['chainage'][has_next]) * 1000).round(2).clip(lower=0),
+        # put the link inbetween the two bridges
+        'chainage': df['chainage'][has_next] + (row_after['chainage'][has_next] - df['chainage'][has_next]) / 2,
+        'condition': np.NAN,
+    })
+
+    # every link right after the row before it
+    df = df.assign(order=2 * position)
+    links = links.assign(order=2 * position[has_next] + 1)
+    with_links_df = pd.concat([df, links]).sort_values(by=['road', 'order'], kind='stable')
+    return with_links_df.drop(columns=['order']).reset_index(drop=True)
+
+
+def remove_chainage_and_add_id(df, first_id=200000):
     """
     This method removes the chainage column as it is not needed anymore, and adds an id column,
-    giving each row a unique id starting from 200000
+    giving each row a unique id (over all roads) starting from first_id
     """
     # Remove chainage
     df = df.drop(columns=['chainage'])
     # Insert an id column
-    df.insert(1, 'id', range(200000, 200000 + len(df)))
+    df.insert(1, 'id', range(first_id, first_id + len(df)))
     return df
 
 
-# Here, all functions are called sequentially
+def format_roads(roads=None, output_dir='../data'):
+    """
+    Run the whole pipeline for the given roads (None: all roads in the data) and write
+    every road to its own network file in output_dir; returns the network of all roads
+
+    The roads are not joined: the inputs do not say where roads cross, so no intersection rows
+    are made. A network of several joined roads is one file that lists every intersection on
+    each of its roads with the same id (see ../data/README.md and tests/test_multi_road.py)
+    """
+    # Create dataframes for the source and sink line
+    start_end_of_road_df = create_source_sink(roads)
+
+    # Format these source and sink dataframes
+    formatted_start_end_of_road_df = format_source_sink(start_end_of_road_df)
 
-# Get the right data, in this case: the N1 road without irrelevant columns
-extracted_df = extract_data()
+    # Get the right data: the bridges of the roads between their ends, without irrelevant columns
+    extracted_df = select_between_road_ends(extract_data(roads), formatted_start_end_of_road_df)
 
-# Sort the data and remove the duplicates
-sorted_df = sort_and_remove_duplicates(extracted_df)
+    # Sort the data and remove the duplicates
+    sorted_df = sort_and_remove_duplicates(extracted_df)
 
-# Add missing columns: model_type, name
-full_df = add_modeltype_name(sorted_df)
+    # Add missing columns: model_type, name
+    full_df = add_modeltype_name(sorted_df)
 
-# Reorder the columns so they match the format
-reordered_df = reorder_columns(full_df)
+    # Reorder the columns so they match the format
+    reordered_df = reorder_columns(full_df)
 
-# Create dataframes for the source and sink line
-start_end_of_road_df = create_source_sink()
+    # Insert the source before the bridges of every road and the sink after them
+    combined_df = combine_road(reordered_df, formatted_start_end_of_road_df)
 
-# Format these source and sink dataframes
-formatted_start_end_of_road_df = format_source_sink(start_end_of_road_df)
+    # Add all the links
+    with_links_df = add_links(combined_df)
 
-# Insert the source before the main dataframe and the sink after words
-combined_df = pd.concat([formatted_start_end_of_road_df.iloc[[0]], reordered_df,
-                         formatted_start_end_of_road_df.iloc[[1]]])
+    # the roads in the order they were asked for
+    if roads is not None:
+        with_links_df['road'] = pd.Categorical(with_links_df['road'], categories=roads)
+        with_links_df = with_links_df.sort_values(by='road', kind='stable')
+        with_links_df['road'] = with_links_df['road'].astype(str)
 
+    # Remove the chainage column and give each record a unique id
+    final_df = remove_chainage_and_add_id(with_links_df)
 
-# Add all the links
-with_links_df = add_links(combined_df)
+    # Save every road to a csv file in the same folder as the other demos
+    for road, road_df in final_df.groupby('road', sort=False):
+        road_df.to_csv(os.path.join(output_dir, f'{road}.csv'), index=False)
+    return final_df
 
-# Remove the chainage column and give each record a unique id
-final_df = remove_chainage_and_add_id(with_links_df)
 
-# Display the DataFrame
-print(final_df)
-print(final_df['length'].sum())
+if __name__ == '__main__':
+    final_df = format_roads(['N1'])
 
-# Save to a csv file in the same folder as the other demos
-final_df.to_csv('../data/N1.csv', index=False)
+    # Display the DataFrame
+    print(final_df)
+    print(final_df.groupby('road')['length'].sum())
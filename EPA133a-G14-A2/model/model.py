@@ -1,10 +1,16 @@
 import mesa
 from mesa import Model
-from mesa.time import BaseScheduler
+from active_scheduler import ActiveScheduler, FastForwardScheduler
 from mesa.space import ContinuousSpace
-from components import Source, Sink, SourceSink, Bridge, Link
-import pandas as pd
-from collections import defaultdict
+from components import Source, Sink, SourceSink, Bridge, Link, Intersection
+from trip_log import TripLog
+from trip_stats import TripStatistics
+from profiling import Profiler
+from network import load_network
+from bridge_delays import BridgeDelays
+from random_streams import RandomStreams
+import scenarios
+import numpy as np
 
 
 # ---------------------------------------------------------------
@@ -47,12 +53,48 @@ class BangladeshModel(Model):
     step_time: int
         step_time = 1 # 1 step is 1 min
 
-    path_ids_dict: defaultdict
-        Key: (origin, destination)
-        Value: the shortest path (Infra component IDs) from an origin to a destination
+    schedule_class: type
+        the scheduler class; None (the default) picks one per run (see active_scheduler.py): the
+        FastForwardScheduler, which only steps the agents with work to do and lets vehicles sleep until
+        they reach the next component, when the trips are recorded with trip_log or trip_stats; the
+        ActiveScheduler, which does not let vehicles sleep, when the DataCollector collects every tick,
+        since all sleeping vehicles would have to be caught up for it every tick anyway
 
-        Since there is only one road in the Demo, the paths are added with the road info;
-        when there is a more complex network layout, the paths need to be managed differently
+    data_path: str
+        the network file the model is generated from
+
+    roads: tuple
+        the names of the roads in the network file that are generated; roads that share
+        a component (an intersection) are joined there
+
+    merge_links, merge_intact_bridges: bool
+        if set, every chain of neighbouring links (and with merge_intact_bridges, of links and bridges
+        that are not broken in this scenario) is generated as one link with the total length of the
+        chain; the trips take exactly as long, but the vehicles cross fewer components. On N1 the links
+        alternate with bridges, so merge_links alone merges nothing; merge_intact_bridges is what
+        shortens the routes there (413 components to 9 in scenario 4)
+
+    network: Network
+        the static network data (column arrays and routes), shared by all models of the same network in a process
+
+    route_table: RouteTable
+        all routes of the network; a route id identifies the shortest path from an origin to a destination,
+        stored as an array of infra indices together with the cumulative length along the path
+
+        The roads are joined at their intersections into one graph; a route is found with a
+        shortest path search the first time it is asked for, and kept in a bounded LRU cache
+
+    infra: list
+        all infrastructure components, by infra index (the order they were added to the schedule)
+
+    bridge_delays: BridgeDelays
+        draws the delay times of all broken bridges, once per tick
+
+    streams: RandomStreams
+        all random streams of the run (per bridge, per source, the bridge delays), derived from the seed
+
+    rng: Generator
+        the model's own random stream
 
     sources: list
         all sources in the network
@@ -60,21 +102,88 @@ class BangladeshModel(Model):
     sinks: list
         all sinks in the network
 
+    destinations: dict
+        Key: a source
+        Value: the sinks its trucks can go to, i.e. all sinks connected to it except itself
+
+    truck_counter: int
+        the number of trucks generated by ALL sources of this model. Used as Truck ID!
+
+    vehicle_pool: list
+        the vehicle objects of removed trucks, which are reused for new trucks (see Vehicle.create)
+
+    trip_log: TripLog
+        if the model is created with trip_log=True, the sinks write one record per removed vehicle
+        to this log and the per-tick agent DataCollector is not used; None otherwise
+
+    trip_writer: TripWriter
+        if given, the trips are written to it in batches of trip_writer.batch_size during the run,
+        and the trip log only holds the trips that are not written yet (implies trip_log=True);
+        call flush_trips at the end of the run to write the rest
+
+    trip_stats: TripStatistics
+        if the model is created with trip_stats=True, the sinks and bridges update these online
+        statistics (running mean and variance, per origin-destination pair and per bridge, and
+        quantiles) of the trips; with trip_stats and without trip_log, no trip records are kept at all
+
+    steady_state: SteadyStateMonitor
+        if given, the sinks record every trip time in it, and the model stops (running is set to False)
+        once the mean trip time after the warm-up has converged; see steady_state.py
+
+    profiler: Profiler
+        if the model is created with profile=True, the number of calls and the wall time of the hot
+        paths of the model, per agent class (see profiling.py); None otherwise. Close it after the run
+
     """
 
     step_time = 1
+    # the scheduler that activates the agents; subclasses can replace it with another scheduler
+    schedule_class = None
+    profiler = None
 
-    def __init__(self, seed, scenario, x_max=500, y_max=500, x_min=0, y_min=0):
+    def __init__(self, seed, scenario, x_max=500, y_max=500, x_min=0, y_min=0, trip_log=False,
+                 data_path='../data/N1.csv', roads=('N1',), merge_links=False, merge_intact_bridges=False,
+                 trip_writer=None, trip_stats=False, steady_state=None, profile=False):
 
-        self.schedule = BaseScheduler(self)
         self.running = True
-        self.path_ids_dict = defaultdict(lambda: pd.Series())
+        self.data_path = data_path
+        # the names of the roads to be generated, e.g. ('N1', 'N2', 'N3', 'N4', 'N5', 'N6', 'N7', 'N8')
+        self.roads = tuple(roads)
+        self.merge_links = merge_links
+        self.merge_intact_bridges = merge_intact_bridges
+        self.network = None
+        self.route_table = None
+        self.infra = []
+        self.bridge_delays = None
         self.space = None
         self.sources = []
         self.sinks = []
+        self.destinations = {}
         self.seed = seed
         self.scenario = scenario
-        self.generate_model()
+        self.streams = RandomStreams(seed)
+        self.rng = self.streams.generator(RandomStreams.MODEL)
+        self.trip_writer = trip_writer
+        self.trip_log = TripLog() if trip_log or trip_writer is not None else None
+        self.trip_stats = TripStatistics() if trip_stats else None
+        self.steady_state = steady_state
+        schedule_class = self.schedule_class
+        if schedule_class is None:
+            schedule_class = FastForwardScheduler if self.trip_log is not None or trip_stats else ActiveScheduler
+        self.schedule = schedule_class(self)
+        # before the agents are made, so that the profile includes adding them to the schedule
+        self.profiler = Profiler() if profile else None
+        # truck IDs are counted per model, so that a run gives the same output
+        # no matter which other models run in the same process
+        self.truck_counter = 0
+        self.vehicle_pool = []
+        try:
+            self.generate_model()
+        except BaseException:
+            # a model that could not be made is never run, so its timers would stay installed
+            if self.profiler is not None:
+                self.profiler.close()
+            raise
         self.model_reporters = {}
         self.agent_reporters = {}
         self.model_vars = {}
@@ -86,51 +195,46 @@ class BangladeshModel(Model):
         self.datacollector = mesa.DataCollector(model_reporters={},
                                                 agent_reporters={"Delay time": lambda a: get_delay(a) if a.__class__.__name__ == 'Bridge' else None,
                                                                  "Driving time of cars leaving": lambda a: a.vehicle_removed_driving_time if a.__class__.__name__ == 'Sink' or a.__class__.__name__ == 'SourceSink' else None})
+        if self.profiler is not None:
+            self.profiler.time_reporters(self.datacollector)
 
     def generate_model(self):
         """
         generate the simulation model according to the csv file component information
 
-        Warning: the labels are the same as the csv column labels
+        Warning: the labels are the same as the csv column labels (see network.py)
         """
 
-        df = pd.read_csv('../data/N1.csv')
-        # a list of names of roads to be generated
-        roads = ['N1']
-
-        # roads = [
-        #     'N1', 'N2', 'N3', 'N4',
-        #     'N5', 'N6', 'N7', 'N8'
-        # ]
+        # the network is parsed once per process; every model builds its agents from its column arrays
+        network = load_network(self.data_path, self.roads)
+
+        # which bridges are broken in this scenario, decided for all bridges at once
+        is_bridge = network.model_type == 'bridge'
+        broken = np.zeros(len(network), dtype=bool)
+        broken[is_bridge] = scenarios.broken_bridges(self.seed, self.scenario,
+                                                     network.id[is_bridge], network.condition[is_bridge])
+        # the delay index of a bridge is its position among all bridges of the network, so its delays
+        # do not depend on which other bridges are broken (or merged away below)
+        delay_index = dict(zip(network.id[is_bridge].tolist(), range(int(is_bridge.sum()))))
+        bridge_lengths = network.length[is_bridge].tolist()
+
+        if self.merge_links or self.merge_intact_bridges:
+            # merge the chains of links (and intact bridges) into single links; the trips take just as long
+            mergeable = network.model_type == 'link'
+            if self.merge_intact_bridges:
+                mergeable |= is_bridge & ~broken
+            broken_ids = network.id[broken]
+            network = network.coarsened(mergeable)
+            broken = np.isin(network.id, broken_ids)
+
+        self.network = network
+        self.route_table = network.route_table
 
-        df_objects_all = []
-        for road in roads:
-
-            # be careful with the sorting
-            # better remove sorting by id
-            # Select all the objects on a particular road
-            df_objects_on_road = df[df['road'] == road].sort_values(by=['id'])
-
-            if not df_objects_on_road.empty:
-                df_objects_all.append(df_objects_on_road)
-
-                # the object IDs on a given road
-                path_ids = df_objects_on_road['id']
-                # add the path to the path_ids_dict
-                self.path_ids_dict[path_ids[0], path_ids.iloc[-1]] = path_ids
-                # put the path in reversed order and reindex
-                path_ids = path_ids[::-1]
-                path_ids.reset_index(inplace=True, drop=True)
-                # add the path to the path_ids_dict so that the vehicles can drive backwards too
-                self.path_ids_dict[path_ids[0], path_ids.iloc[-1]] = path_ids
-
-        # put back to df with selected roads so that min and max and be easily calculated
-        df = pd.concat(df_objects_all)
         y_min, y_max, x_min, x_max = set_lat_lon_bound(
-            df['lat'].min(),
-            df['lat'].max(),
-            df['lon'].min(),
-            df['lon'].max(),
+            network.lat.min(),
+            network.lat.max(),
+            network.lon.min(),
+            network.lon.max(),
             0.05
         )
 
@@ -138,52 +242,97 @@ class BangladeshModel(Model):
         # not to be confused with the SimpleContinuousModule visualization
         self.space = ContinuousSpace(x_max, y_max, True, x_min, y_min)
 
-        for df in df_objects_all:
-            for _, row in df.iterrows():    # index, row in ...
-
-                # create agents according to model_type
-                model_type = row['model_type']
-                agent = None
-
-                if model_type == 'source':
-                    agent = Source(row['id'], self, row['length'], row['name'], row['road'])
-                    self.sources.append(agent.unique_id)
-                elif model_type == 'sink':
-                    agent = Sink(row['id'], self, row['length'], row['name'], row['road'])
-                    self.sinks.append(agent.unique_id)
-                elif model_type == 'sourcesink':
-                    agent = SourceSink(row['id'], self, row['length'], row['name'], row['road'])
-                    self.sources.append(agent.unique_id)
-                    self.sinks.append(agent.unique_id)
-                elif model_type == 'bridge':
-                    agent = Bridge(row['id'], self, row['length'], row['name'], row['road'], row['condition'],
-                                   scenario=self.scenario, seed=self.seed)
-                elif model_type == 'link':
-                    agent = Link(row['id'], self, row['length'], row['name'], row['road'])
-
-                if agent:
-                    self.schedule.add(agent)
-                    y = row['lat']
-                    x = row['lon']
-                    self.space.place_agent(agent, (x, y))
-                    agent.pos = (x, y)
+        for unique_id, model_type, length, name, road, condition, is_broken, x, y in zip(
+                network.id.tolist(), network.model_type.tolist(), network.length.tolist(), network.name.tolist(),
+                network.road.tolist(), network.condition.tolist(), broken.tolist(),
+                network.lon.tolist(), network.lat.tolist()):
+
+            # create agents according to model_type
+            if model_type == 'source':
+                agent = Source(unique_id, self, length, name, road)
+                self.sources.append(agent.unique_id)
+            elif model_type == 'sink':
+                agent = Sink(unique_id, self, length, name, road)
+                self.sinks.append(agent.unique_id)
+            elif model_type == 'sourcesink':
+                agent = SourceSink(unique_id, self, length, name, road)
+                self.sources.append(agent.unique_id)
+                self.sinks.append(agent.unique_id)
+            elif model_type == 'bridge':
+                agent = Bridge(unique_id, self, length, name, road, condition,
+                               scenario=self.scenario, delay_time=int(is_broken))
+            elif model_type == 'intersection':
+                agent = Intersection(unique_id, self, length, name, road)
+            else:
+                agent = Link(unique_id, self, length, name, road)
+
+            self.schedule.add(agent)
+            self.infra.append(agent)
+            self.space.place_agent(agent, (x, y))
+            agent.pos = (x, y)
+
+        # the delays of all bridges are drawn at once per tick
+        for agent in self.infra:
+            if isinstance(agent, Bridge) and agent.delay_time != 0:
+                agent.delay_index = delay_index[agent.unique_id]
+        self.bridge_delays = BridgeDelays(self.streams.key(RandomStreams.DELAYS), bridge_lengths)
+
+    def get_random_sink(self, source):
+        """
+        pick up a random destination given an origin, from the random stream of the source
+        """
+        if source not in self.destinations:
+            # different source and sink, connected by the network
+            self.destinations[source] = self.network.destinations(source)
+        destinations = self.destinations[source]
+        source_agent = self.infra[self.route_table.index[source]]
+        return destinations[source_agent.rng.integers(len(destinations))]
 
     def get_random_route(self, source):
         """
-        pick up a random route given an origin
+        pick up a random route given an origin, and return its route id
         """
-        while True:
-            # different source and sink
-            sink = self.random.choice(self.sinks)
-            if sink is not source:
-                break
-        return self.path_ids_dict[source, sink]
+        return self.route_table.route(source, self.get_random_sink(source))
 
     def step(self):
         """
         Advance the simulation by one step.
         """
         self.schedule.step()
+        if self.trip_log is None and self.trip_stats is None:
+            self.collect()
+        elif self.trip_log is not None:
+            self.collect_trips()
+        self.check_steady_state()
+
+    def collect(self):
+        """
+        Collect the agent data of this tick with the DataCollector
+        """
+        # the DataCollector can look at any agent, so the sleeping vehicles are caught up first
+        if hasattr(self.schedule, 'synchronize'):
+            self.schedule.synchronize()
         self.datacollector.collect(self)
 
+    def check_steady_state(self):
+        """
+        Stop the model once the steady-state monitor (if any) says the trip time has converged
+        """
+        if self.steady_state is not None and self.steady_state.check(self.schedule.steps):
+            self.running = False
+
+    def collect_trips(self):
+        """
+        Write the trips to the trip writer once a whole batch is in the trip log
+        """
+        if self.trip_writer is not None and len(self.trip_log) >= self.trip_writer.batch_size:
+            self.flush_trips()
+
+    def flush_trips(self):
+        """
+        Write the trips in the trip log to the trip writer and clear the log
+        """
+        self.trip_writer.write(self.trip_log)
+        self.trip_log.clear()
+
     # EOF -----------------------------------------------------------
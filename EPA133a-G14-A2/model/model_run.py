@@ -1,4 +1,6 @@
-from model import BangladeshModel
+from batch_run import run_batch
+from result_store import ResultStore
+from replications import run_adaptive
 
 """
     Run simulation
@@ -10,30 +12,40 @@ from model import BangladeshModel
 # run time 5 x 24 hours; 1 tick 1 minute
 run_length = 7200
 
-scenario_list = [0,1, 2, 3, 4, 5, 6, 7, 8]
+scenario_list = [0, 1, 2, 3, 4, 5, 6, 7, 8]
 
 seed_list = [1234567, 1234568, 1234569, 1234560, 1234561,
              1234562, 1234563, 1234564, 1234565, 1234566]
 
-# to print a progress update at each run
-number_of_runs = len(scenario_list)*len(seed_list)
-counter = 0
-
-for i in scenario_list:
-    for seed_index, j in enumerate(seed_list):
-        sim_model = BangladeshModel(scenario=i, seed=j)
-
-        # One run with given steps
-        for k in range(run_length):
-            sim_model.step()
-
-        df = sim_model.datacollector.get_agent_vars_dataframe()
-        # subset dataframe to only show the sinks and sourcesinks
-        # because we want to collect what vehicles they removed and their driving time
-        df = df[df['Driving time of cars leaving'].notnull()]
-        df = df[df['Driving time of cars leaving'].str.len() != 0]
-        df.to_csv("../model/OutputModel.csv")
-        df.to_csv(f"../model/experiment/Scenario{i}_sim{seed_index}.csv")
-
-        counter += 1
-        print(counter, '/', number_of_runs, 'Done. Next up: scenario:', i,  'seed: ', j)
+# if set, every run stops as soon as the confidence interval of its mean trip time after the warm-up
+# (MSER-5) is within this fraction of the mean; run_length is then the longest a run can take
+early_stop = None
+
+# if True, every scenario is run for only as many seeds as it needs: seeds are added (in the same order
+# for all scenarios, so all scenarios get common random numbers) until the confidence interval of the mean
+# trip time is within target_half_width of the mean, or max_replications seeds are used
+adaptive = False
+target_half_width = 0.05
+max_replications = 50
+adaptive_seed_list = seed_list + [1234570 + i for i in range(max_replications - len(seed_list))]
+
+# if True, every run writes the number of calls and the wall time of the hot paths of the model, per agent
+# class, to experiment/profiles (see profiling.py); this makes the runs somewhat slower
+profile = False
+
+# the number of worker processes the runs are spread over; None uses all available cores,
+# 1 runs everything serially in this process
+workers = None
+
+# the guard is needed so that the worker processes can import this file without starting a sweep themselves
+if __name__ == '__main__':
+    # runs that were done before with exactly the same inputs are taken from the store instead of run again
+    store = ResultStore('../model/experiment/.store', data_path='../data/N1.csv')
+    if adaptive:
+        summary, failed = run_adaptive(scenario_list, adaptive_seed_list, run_length, target=target_half_width,
+                                       output_dir='../model/experiment', workers=workers, store=store,
+                                       early_stop=early_stop)
+        print(summary)
+    else:
+        run_batch(scenario_list, seed_list, run_length, output_dir='../model/experiment', workers=workers,
+                  store=store, early_stop=early_stop, profile=profile)
@@ -0,0 +1,383 @@
+import os
+from collections import OrderedDict
+from functools import cached_property
+from multiprocessing import shared_memory
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from routes import RouteTable
+from atomic_files import atomic_path
+
+"""
+    Cached, pre-parsed network loading
+
+    The network csv file is parsed once into a compact binary (npz) file next to it, with one
+    array per column. The npz file is rebuilt when the csv file changes. Within a process the
+    network of a (data_path, roads) combination is loaded only once, so every model after the
+    first one builds its agents straight from the column arrays.
+
+    The roads of a network are joined into one graph at the components they share (intersections),
+    and a route is the shortest path through that graph.
+
+    For a sweep over several processes, a SharedNetwork publishes the arrays of a network once
+    in shared memory and the workers attach to it instead of loading the network themselves.
+"""
+
+# the columns of the network file, and the dtype they are stored with
+columns = {
+    'road': str,
+    'id': np.int64,
+    'model_type': str,
+    'name': str,
+    'lat': np.float64,
+    'lon': np.float64,
+    'length': np.float64,
+    'condition': str,
+}
+
+# the model types the model generates an agent for
+model_types = ('source', 'sink', 'sourcesink', 'bridge', 'link', 'intersection')
+
+# the maximum number of routes a network keeps in its route table
+route_cache_size = 4096
+
+# the maximum number of coarsened versions a network keeps; with merge_intact_bridges every
+# (scenario, seed) has its own set of mergeable components, so a sweep would otherwise keep
+# one coarsened network (with its own route table) per run
+coarsened_cache_size = 4
+
+
+# ---------------------------------------------------------------
+def cache_path(data_path):
+    """
+    The path of the npz file of a network file
+    """
+    return os.path.splitext(data_path)[0] + '.npz'
+
+
+def read_columns(data_path):
+    """
+    The columns of a network file as a dict of arrays, from its npz file if that is up to date
+
+    The npz file stores the modification time and size of the csv file it was made from;
+    if either differs, the csv file is parsed again and the npz file is rewritten
+    """
+    stat = os.stat(data_path)
+    source = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    npz_path = cache_path(data_path)
+    if os.path.exists(npz_path):
+        with np.load(npz_path) as cached:
+            if np.array_equal(cached['source'], source):
+                return {column: cached[column] for column in columns}
+
+    df = pd.read_csv(data_path)
+    arrays = {}
+    for column, dtype in columns.items():
+        if dtype is str:
+            # fixed-width unicode arrays, so the npz file can be loaded without pickle
+            arrays[column] = df[column].fillna('').astype(str).to_numpy(dtype=str)
+        else:
+            arrays[column] = df[column].to_numpy(dtype=dtype)
+    # write to a temporary file of this process first, so a process never reads a half-written cache
+    with atomic_path(npz_path, suffix='.npz') as tmp_path:
+        np.savez(tmp_path, source=source, **arrays)
+    return arrays
+
+
+# ---------------------------------------------------------------
+class Network:
+    """
+    The static data of a road network: its components, as column arrays, the graph that connects
+    them, and its routes
+
+    The components are in the order the model adds them to the schedule: by road (in the given
+    order of the roads), then in the order of the network file. The position of a component is
+    its infra index. A component that is on several roads (an intersection) has the same id on
+    all of them and is added only once, with the first of its roads; it joins the roads in the graph.
+
+    Attributes
+    __________
+    data_path: str
+        the network file
+
+    roads: tuple
+        the names of the roads in the network
+
+    road, id, model_type, name, lat, lon, length, condition: array
+        one array per column of the network file, by infra index; a component without
+        a condition has the empty string
+
+    edges: 2D array
+        the infra indices of every pair of components that are next to each other on a road
+
+    route_table: RouteTable
+        the routes of the network; a route is the shortest path from its origin to its destination,
+        found the first time it is asked for
+
+    sources, sinks: list
+        the ids of the sources and sinks, by infra index
+    """
+
+    def __init__(self, data_path, roads, arrays, route_arrays=None):
+        """
+        arrays: dict
+            the column arrays and the edges of the components of the network, by infra index, and
+            optionally their connected components (see component)
+
+        route_arrays: dict
+            routes to start with, as flat arrays of RouteTable.arrays()
+        """
+        self.data_path = data_path
+        self.roads = tuple(roads)
+        for column in columns:
+            array = arrays[column]
+            array.setflags(write=False)
+            setattr(self, column, array)
+        self.edges = arrays['edges']
+        self.edges.setflags(write=False)
+        if 'component' in arrays:
+            # published by a SharedNetwork; then the graph is only built if a route has to be found
+            self.component = arrays['component']
+            self.component.setflags(write=False)
+        if route_arrays is None:
+            self.route_table = RouteTable(self.id, self.length,
+                                          find_path=self.shortest_path, cache_size=route_cache_size)
+        else:
+            self.route_table = RouteTable.from_arrays(self.id, self.length, **route_arrays,
+                                                      find_path=self.shortest_path, cache_size=route_cache_size)
+        self.sources = self.id[np.isin(self.model_type, ('source', 'sourcesink'))].tolist()
+        self.sinks = self.id[np.isin(self.model_type, ('sink', 'sourcesink'))].tolist()
+        # the coarsened versions of this network, by the components they merge;
+        # from the least to the most recently used
+        self._coarsened = OrderedDict()
+
+    @classmethod
+    def from_columns(cls, data_path, roads, arrays):
+        """
+        The network of the given roads, from the column arrays of a whole network file
+        """
+        road_rows = []
+        for road in roads:
+            # the components of a road are connected in the order of the network file
+            road_rows.append(np.flatnonzero((arrays['road'] == road) & np.isin(arrays['model_type'], model_types)))
+        rows = np.concatenate(road_rows) if road_rows else np.empty(0, dtype=np.intp)
+
+        # every component once, at its first row
+        _, first = np.unique(arrays['id'][rows], return_index=True)
+        selected = rows[np.sort(first)]
+        network_arrays = {column: arrays[column][selected] for column in columns}
+
+        infra_index = {infra_id: i for i, infra_id in enumerate(network_arrays['id'].tolist())}
+        edges = [np.array([infra_index[infra_id] for infra_id in arrays['id'][on_road].tolist()], dtype=np.int64)
+                 for on_road in road_rows]
+        edges = [np.column_stack((path[:-1], path[1:])) for path in edges]
+        network_arrays['edges'] = np.concatenate(edges) if edges else np.empty((0, 2), dtype=np.int64)
+        return cls(data_path, roads, network_arrays)
+
+    def __len__(self):
+        return len(self.id)
+
+    @cached_property
+    def graph(self):
+        """
+        The undirected graph of the network: a node per infra index and an edge per pair of
+        neighbouring components, weighted by half of the length of both, so that the weight of a
+        path is the length of the components on it (apart from half of the first and the last)
+        """
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(self)))
+        weights = (self.length[self.edges[:, 0]] + self.length[self.edges[:, 1]]) / 2
+        graph.add_weighted_edges_from(zip(self.edges[:, 0].tolist(), self.edges[:, 1].tolist(), weights.tolist()))
+        return graph
+
+    @cached_property
+    def component(self):
+        """
+        The connected component of every infra index; two components are only connected
+        by a route if they are in the same connected component
+        """
+        component = np.empty(len(self), dtype=np.int64)
+        for label, nodes in enumerate(nx.connected_components(self.graph)):
+            component[list(nodes)] = label
+        return component
+
+    def shortest_path(self, origin, destination):
+        """
+        The infra ids on the shortest path from origin to destination (Dijkstra)
+        """
+        index = self.route_table.index
+        path = nx.dijkstra_path(self.graph, index[origin], index[destination], weight='weight')
+        return self.id[path].tolist()
+
+    def destinations(self, source):
+        """
+        The sinks that trucks from the source can go to: all sinks connected to it, except itself
+        """
+        index = self.route_table.index
+        return [sink for sink in self.sinks
+                if sink != source and self.component[index[sink]] == self.component[index[source]]]
+
+    @cached_property
+    def bridges(self):
+        """
+        The bridges as a dataframe indexed by id, with their length and condition
+        """
+        is_bridge = self.model_type == 'bridge'
+        return pd.DataFrame({'length': self.length[is_bridge], 'condition': self.condition[is_bridge]},
+                            index=pd.Index(self.id[is_bridge], name='id'))
+
+    def coarsened(self, mergeable):
+        """
+        The network with every chain of neighbouring mergeable components merged into one link
+
+        mergeable: array bool
+            by infra index, whether the component may be merged with its neighbours, e.g. the links
+            (and the bridges that do not break down); sources, sinks and intersections never should be
+
+        A merged link gets the id, name and position of the first component of its chain and the
+        total length of the chain. A truck always drives through a whole chain, so its trip takes
+        exactly as many ticks as on the original network, but it crosses fewer components. How many
+        fewer depends on the network: on N1 every link lies between two bridges (or a bridge and a
+        source), so merging only the links merges nothing; the chains only get long when the intact
+        bridges are merged as well.
+
+        The last coarsened_cache_size coarsened networks are kept, so models with the same set of
+        mergeable components (e.g. the same scenario and seed) share one.
+        """
+        mergeable = np.asarray(mergeable, dtype=bool)
+        key = mergeable.tobytes()
+        if key in self._coarsened:
+            self._coarsened.move_to_end(key)
+        else:
+            # the chains: the connected groups of mergeable components
+            chains = nx.Graph()
+            chains.add_nodes_from(np.flatnonzero(mergeable).tolist())
+            inside = mergeable[self.edges[:, 0]] & mergeable[self.edges[:, 1]]
+            chains.add_edges_from(self.edges[inside].tolist())
+            # every component is represented by the first component of its chain
+            representative = np.arange(len(self))
+            for chain in nx.connected_components(chains):
+                chain = sorted(chain)
+                representative[chain] = chain[0]
+
+            kept = np.flatnonzero(representative == np.arange(len(self)))
+            new_index = np.full(len(self), -1, dtype=np.int64)
+            new_index[kept] = np.arange(len(kept))
+            node = new_index[representative]
+
+            arrays = {column: getattr(self, column)[kept] for column in columns}
+            arrays['length'] = np.bincount(node, weights=self.length, minlength=len(kept))
+            merged = np.bincount(node, minlength=len(kept)) > 1
+            arrays['model_type'] = np.where(merged, 'link', arrays['model_type'])
+            arrays['condition'] = np.where(merged, '', arrays['condition'])
+            edges = node[self.edges]
+            arrays['edges'] = edges[edges[:, 0] != edges[:, 1]]
+            self._coarsened[key] = Network(self.data_path, self.roads, arrays)
+            if len(self._coarsened) > coarsened_cache_size:
+                self._coarsened.popitem(last=False)
+        return self._coarsened[key]
+
+    def arrays(self):
+        """
+        All static data of the network as a dict of arrays: the columns, the edges, the connected
+        components and the flat route table
+        """
+        arrays = {column: getattr(self, column) for column in columns}
+        arrays['edges'] = self.edges
+        arrays['component'] = self.component
+        route_arrays = self.route_table.arrays()
+        # the infra ids and lengths of the route table are the id and length columns
+        del route_arrays['infra_ids'], route_arrays['lengths']
+        arrays.update(route_arrays)
+        return arrays
+
+
+# the networks loaded in this process, by (data_path, roads)
+_networks = {}
+
+
+def load_network(data_path='../data/N1.csv', roads=('N1',)):
+    """
+    The Network of the given roads in a network file, loaded once per process
+
+    A worker process that attached to a SharedNetwork gets the shared one
+    """
+    key = (data_path, tuple(roads))
+    if key not in _networks:
+        _networks[key] = Network.from_columns(data_path, roads, read_columns(data_path))
+    return _networks[key]
+
+
+# ---------------------------------------------------------------
+class SharedNetwork:
+    """
+    A network published in one block of shared memory, for the worker processes of a sweep
+
+    The parent process publishes the network once; the workers attach to it with attach(layout)
+    and build their models on top of the shared arrays, without a copy of their own and without
+    loading the network file. The routes between all sources and sinks and the connected components
+    are published too, so a worker never builds the graph of the network unless it has to find a
+    route that is not in the table (e.g. one evicted from the cache).
+    Use it as a context manager, so the block is released at the end.
+
+    Attributes
+    __________
+    layout: dict
+        everything a worker needs to attach (the name of the block, and the dtype, shape and offset
+        of every array in it); small and picklable, e.g. to pass as initargs of a process pool
+    """
+
+    def __init__(self, network):
+        # find the routes between all sources and sinks first, so that the workers do not have to
+        for source in network.sources:
+            for sink in network.destinations(source):
+                network.route_table.route(source, sink)
+        arrays = network.arrays()
+        fields = {}
+        size = 0
+        for name, array in arrays.items():
+            # align every array to 64 bytes
+            size = -(-size // 64) * 64
+            fields[name] = (array.dtype.str, array.shape, size)
+            size += array.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, array in arrays.items():
+            dtype, shape, offset = fields[name]
+            np.ndarray(shape, dtype, buffer=self.shm.buf, offset=offset)[...] = array
+        self.layout = {'name': self.shm.name, 'data_path': network.data_path, 'roads': network.roads,
+                       'fields': fields}
+
+    def close(self):
+        """
+        Release the shared memory block
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# the shared memory blocks this process attached to; they stay mapped while the process runs
+_attached = []
+
+
+def attach(layout):
+    """
+    Attach to a SharedNetwork, so that load_network returns the shared network in this process
+    """
+    # the worker processes of a pool share the resource tracker of the publishing process,
+    # so the block is released once, by SharedNetwork.close
+    shm = shared_memory.SharedMemory(name=layout['name'])
+    _attached.append(shm)
+    arrays = {name: np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+              for name, (dtype, shape, offset) in layout['fields'].items()}
+    route_arrays = {name: arrays.pop(name) for name in list(arrays) if name.startswith('route_')}
+    network = Network(layout['data_path'], layout['roads'], arrays, route_arrays)
+    _networks[network.data_path, network.roads] = network
+    return network
@@ -0,0 +1,179 @@
+import time
+import functools
+from collections import defaultdict
+
+import pandas as pd
+
+"""
+    Opt-in profiling of the hot paths of the model
+
+    BangladeshModel(..., profile=True) gives the model a Profiler (model.profiler), which records the
+    number of calls and the cumulative wall time of the methods in hot_paths, per agent class. The
+    methods are only wrapped with a timer while there is a profiler: without one the classes are
+    not touched at all, so a model that is not profiled runs at full speed.
+
+    The agent reporters of the DataCollector of a profiled model are timed too, each as a method of
+    'DataCollector' with the name of the reporter; they are called once per agent per tick.
+
+    model.profiler.table() gives the profile of the run, one row per (class, method). The timers
+    themselves take time, so a profiled run is slower than a normal one; compare the shares of the
+    methods rather than their absolute times.
+"""
+
+
+# ---------------------------------------------------------------
+def hot_paths():
+    """
+    Dict class -> the names of its methods that are profiled
+    """
+    # imported here, since model.py imports this module
+    from model import BangladeshModel
+    from components import Source, Sink, SourceSink, Bridge, Vehicle
+    from active_scheduler import ActiveScheduler, FastForwardScheduler
+    from event_engine import EventDrivenModel, EventScheduler
+    from vectorized import VectorizedModel
+
+    return {
+        BangladeshModel: ('step', 'collect', 'collect_trips'),
+        EventDrivenModel: ('run',),
+        VectorizedModel: ('step', 'run', 'move_trucks', 'locate_trucks', 'generate_trucks', 'remove_trucks'),
+        ActiveScheduler: ('add', 'remove'),
+        FastForwardScheduler: ('add', 'remove', 'synchronize'),
+        EventScheduler: ('add', 'step', 'run', 'activate'),
+        Source: ('step', 'generate_truck'),
+        Sink: ('step', 'remove'),
+        SourceSink: ('step',),
+        Bridge: ('get_delay_time',),
+        Vehicle: ('step', 'drive', 'drive_to_next', 'arrive_at_next'),
+    }
+
+
+# the original methods of the wrapped classes, (class, name) -> function, while there are profilers
+_originals = {}
+_profilers = 0
+
+
+def _timed(method, name):
+    """
+    The method, wrapped to record its calls in the profiler of the model of its object (if any)
+
+    The time of a method that (indirectly) calls itself, like drive_to_next, only counts once
+    """
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        profiler = getattr(self, 'model', self).profiler
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        key = (type(self).__name__, name)
+        depth = profiler.depth[key]
+        profiler.depth[key] = depth + 1
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.depth[key] = depth
+            profiler.calls[key] += 1
+            if depth == 0:
+                profiler.seconds[key] += elapsed
+    return timed
+
+
+def install():
+    """
+    Wrap the hot paths with timers, once for all profilers in the process
+    """
+    global _profilers
+    if _profilers == 0:
+        for cls, names in hot_paths().items():
+            for name in names:
+                # only the methods the class defines itself, so an inherited method is not wrapped twice
+                if name in vars(cls):
+                    _originals[cls, name] = vars(cls)[name]
+                    setattr(cls, name, _timed(vars(cls)[name], name))
+    _profilers += 1
+
+
+def uninstall():
+    """
+    Restore the original methods once the last profiler is closed
+    """
+    global _profilers
+    _profilers -= 1
+    if _profilers == 0:
+        for (cls, name), method in _originals.items():
+            setattr(cls, name, method)
+        _originals.clear()
+
+
+# ---------------------------------------------------------------
+class Profiler:
+    """
+    Call counts and cumulative wall time of the hot paths of one model
+
+    The timers stay installed until the profiler is closed; close it (or use it as a context
+    manager) when the run is done, so later models in the process are not slowed down
+
+    Attributes
+    __________
+    calls: dict
+        Key: (class name, method name)
+        Value: the number of calls
+
+    seconds: dict
+        Key: (class name, method name)
+        Value: the cumulative wall time of the calls, including the methods they call
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        # the number of calls of every method that are running, to time recursive calls only once
+        self.depth = defaultdict(int)
+        self.closed = False
+        install()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            uninstall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def time_reporters(self, datacollector):
+        """
+        Time every agent reporter of a DataCollector, as method <reporter name> of 'DataCollector'
+        """
+        for name, reporter in list(datacollector.agent_reporters.items()):
+            datacollector.agent_reporters[name] = self._timed_reporter(reporter, ('DataCollector', name))
+
+    def _timed_reporter(self, reporter, key):
+        def timed(agent):
+            start = time.perf_counter()
+            try:
+                return reporter(agent)
+            finally:
+                self.seconds[key] += time.perf_counter() - start
+                self.calls[key] += 1
+        return timed
+
+    def table(self):
+        """
+        The profile as a dataframe, one row per (class, method), the most expensive first: the number
+        of calls, the total and per-call wall time, and the share of the total time of the run: the
+        time of the run() of the model if it was run that way (the event-driven and vectorized
+        engines), else of its steps
+        """
+        rows = [(cls, method, self.calls[cls, method], seconds) for (cls, method), seconds in self.seconds.items()]
+        df = pd.DataFrame(rows, columns=['class', 'method', 'calls', 'seconds'])
+        df['us_per_call'] = df['seconds'] / df['calls'] * 1e6
+        is_model = df['class'].str.endswith('Model')
+        total = df.loc[is_model & df['method'].eq('run'), 'seconds'].sum()
+        if not total:
+            total = df.loc[is_model & df['method'].eq('step'), 'seconds'].sum()
+        df['share'] = df['seconds'] / total if total else float('nan')
+        return df.sort_values('seconds', ascending=False, ignore_index=True)
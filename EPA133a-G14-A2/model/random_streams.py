@@ -0,0 +1,52 @@
+import numpy as np
+
+"""
+    Independent random streams derived from one root seed
+
+    Every random stream of a model run is a NumPy Generator of its own, derived from the run's
+    seed with a SeedSequence whose spawn key names what the stream is for (and for which agent).
+    Because a stream only depends on the seed and its name, and never on global state or on the
+    order in which the streams are created, several models can run in one process, in threads
+    or in any parallel layout and still draw exactly the same numbers.
+"""
+
+
+# ---------------------------------------------------------------
+class RandomStreams:
+    """
+    The hierarchy of random streams of one model run
+
+    Class Attributes:
+    -----------------
+    MODEL, BREAKDOWN, SOURCE, DELAYS: int
+        the first element of the spawn key of the streams for, respectively, model-level draws,
+        the breakdown roll of a bridge, the destinations of the trucks of a source, and the
+        delay times of the broken bridges
+    """
+
+    MODEL = 0
+    BREAKDOWN = 1
+    SOURCE = 2
+    DELAYS = 3
+
+    def __init__(self, seed):
+        self.seed = seed
+
+    def seed_sequence(self, purpose, *ids):
+        """
+        The SeedSequence of a stream, e.g. seed_sequence(RandomStreams.BREAKDOWN, bridge_id)
+        """
+        return np.random.SeedSequence(self.seed, spawn_key=(purpose, *ids))
+
+    def generator(self, purpose, *ids):
+        """
+        A new Generator of a stream; two calls with the same arguments give the same numbers
+        """
+        return np.random.default_rng(self.seed_sequence(purpose, *ids))
+
+    def key(self, purpose, *ids):
+        """
+        A 128-bit integer key of a stream, for counter-based generators such as Philox
+        """
+        low, high = self.seed_sequence(purpose, *ids).generate_state(2, np.uint64)
+        return int(low) | int(high) << 64
@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from batch_run import run_jobs, output_path
+from trip_writer import read_trips
+from trip_stats import t_quantile, confidence_interval
+
+"""
+    Adaptive number of replications per scenario
+
+    Instead of a fixed number of seeds for every scenario, run_adaptive keeps adding seeds to a
+    scenario until the confidence interval of its mean trip time is narrow enough, relative to
+    the mean, or all seeds are used. Stable scenarios stop after a few replications, so the runs
+    go to the scenarios with the most noise.
+
+    All scenarios take their seeds from the same list, in the same order (common random numbers):
+    replication k of every scenario uses the same seed, and so the same breakdown rolls of the
+    bridges, the same destinations of the trucks and the same delay draws (see random_streams.py).
+    The differences between scenarios are then caused by the scenarios, not by the random numbers,
+    which makes the comparison of scenarios much less noisy than with independent seeds.
+"""
+
+
+# ---------------------------------------------------------------
+def run_mean(output_dir, scenario, seed):
+    """
+    The mean travel time of the trips of a finished run
+    """
+    return float(read_trips(output_path(output_dir, scenario, seed))['travel_time'].mean())
+
+
+# ---------------------------------------------------------------
+def run_adaptive(scenario_list, seed_list, run_length, target=0.05, confidence=0.95, min_replications=3,
+                 output_dir='../model/experiment', workers=None, store=None, early_stop=None):
+    """
+    Run every scenario for as many seeds (from the start of seed_list) as needed to bring the
+    relative half-width of the confidence interval of its mean trip time to at most `target`
+
+    target: float
+        the largest accepted half-width of the confidence interval, as a fraction of the mean
+
+    confidence: float
+        the confidence level of the interval
+
+    min_replications: int
+        the number of seeds every scenario is run for at first
+
+    The maximum number of replications is the length of seed_list. After every round, the number
+    of seeds a scenario still needs is estimated from its standard deviation so far, and the next
+    round runs that many more seeds for every scenario that has not converged, in one sweep over
+    the worker pool (see batch_run.run_jobs for workers, store and early_stop). A run that failed,
+    or in which no trip finished, does not count; a scenario with fewer than two runs that count
+    has no confidence interval yet and gets more seeds until it has two. A scenario only stops
+    without converging once all seeds of seed_list are used.
+
+    Returns a dataframe with per scenario the number of seeds it was run for, the number of runs
+    that count (replications), the mean trip time, the half-width and relative half-width of its
+    confidence interval, whether it converged, and its status ('converged', 'seeds exhausted' or
+    'too few runs'), and the failed jobs of all rounds as a dict of (scenario, seed) -> exception.
+    The scenarios that did not converge are also reported when the function returns.
+    """
+    min_replications = max(2, min(min_replications, len(seed_list)))
+    # the number of seeds every scenario is run for so far
+    replications = {scenario: 0 for scenario in scenario_list}
+    wanted = {scenario: min_replications for scenario in scenario_list}
+    means = {scenario: {} for scenario in scenario_list}
+    failed = {}
+    results = {}
+
+    while True:
+        jobs = [(scenario, seed) for scenario in scenario_list
+                for seed in seed_list[replications[scenario]:wanted[scenario]]]
+        if not jobs:
+            break
+        failed.update(run_jobs(jobs, run_length, output_dir, workers, store, early_stop))
+        for scenario, seed in jobs:
+            if (scenario, seed) not in failed:
+                mean = run_mean(output_dir, scenario, seed)
+                # a run that is too short for any trip to finish says nothing about the trip time
+                if not math.isnan(mean):
+                    means[scenario][seed] = mean
+
+        for scenario in scenario_list:
+            replications[scenario] = wanted[scenario]
+            values = list(means[scenario].values())
+            mean, half_width = confidence_interval(values, confidence)
+            relative = half_width / abs(mean) if mean else math.nan
+            if half_width == 0:
+                relative = 0.0
+            converged = relative <= target
+            if converged:
+                status = 'converged'
+            elif len(values) < 2:
+                status = 'too few runs'
+            else:
+                status = 'seeds exhausted'
+            results[scenario] = {'seeds': replications[scenario], 'replications': len(values), 'mean': mean,
+                                 'half_width': half_width, 'relative_half_width': relative,
+                                 'converged': converged, 'status': status}
+            if converged:
+                continue
+            if len(values) < 2:
+                # no confidence interval yet: at least enough seeds for two runs that count
+                needed = replications[scenario] + 2 - len(values)
+            else:
+                # the number of replications at which the half-width would reach the target, at the current spread
+                t = t_quantile((1 + confidence) / 2, len(values) - 1)
+                needed = math.ceil((t * np.std(values, ddof=1) / (target * abs(mean))) ** 2)
+                # the seeds of the runs that did not count do not bring the half-width down
+                needed += replications[scenario] - len(values)
+            wanted[scenario] = min(max(needed, replications[scenario] + 1), len(seed_list))
+
+        converged = sum(result['converged'] for result in results.values())
+        print(f"{converged} / {len(scenario_list)} scenarios converged", flush=True)
+
+    for scenario, result in results.items():
+        if result['status'] == 'too few runs':
+            print(f"scenario {scenario} did not converge: only {result['replications']} of its "
+                  f"{result['seeds']} runs finished with trips, too few for a confidence interval", flush=True)
+        elif result['status'] == 'seeds exhausted':
+            print(f"scenario {scenario} did not converge: all {result['seeds']} seeds used, relative half-width "
+                  f"{result['relative_half_width']:.2%} > {target:.2%}", flush=True)
+    return pd.DataFrame.from_dict(results, orient='index').rename_axis('scenario'), failed
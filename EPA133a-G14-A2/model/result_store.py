@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import shutil
+
+from components import Vehicle, Source
+from scenarios import breakdown_probabilities
+from trip_writer import extension
+from atomic_files import atomic_path
+
+"""
+    Content-addressed store of finished experiment runs
+
+    Every run is stored under a hash of everything that determines its output: the scenario,
+    the seed, the run length, the contents of the network file, the model parameters and the
+    source code of the model.
+    A run whose key is already in the store does not have to be simulated again, and a
+    change to one parameter only changes the keys (and so only re-runs) the runs it affects.
+"""
+
+# the modules whose code determines the output of a run; any change to them changes every key,
+# so that results of an older model are never reused. batch_run.py runs the jobs (early stop,
+# flushing the trips), and the event-driven and vectorized engines give the same trips
+model_modules = ('model.py', 'components.py', 'active_scheduler.py', 'event_engine.py', 'vectorized.py',
+                 'network.py', 'routes.py', 'scenarios.py', 'bridge_delays.py', 'random_streams.py', 'trip_log.py',
+                 'trip_writer.py', 'steady_state.py', 'trip_stats.py', 'batch_run.py')
+
+
+# ---------------------------------------------------------------
+def file_digest(path):
+    """
+    The sha256 hex digest of the contents of a file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def model_digest(directory=os.path.dirname(os.path.abspath(__file__))):
+    """
+    The sha256 hex digest of the source code of the model modules
+    """
+    digest = hashlib.sha256()
+    for name in model_modules:
+        digest.update(name.encode())
+        digest.update(file_digest(os.path.join(directory, name)).encode())
+    return digest.hexdigest()
+
+
+def run_parameters(scenario, seed, run_length, data_digest, early_stop=None, code_digest=None):
+    """
+    All inputs that determine the output of a run, as a json-serializable dict
+
+    code_digest: str
+        the digest of the model code (model_digest); computed if not given
+    """
+    parameters = {
+        'model': model_digest() if code_digest is None else code_digest,
+        'scenario': scenario,
+        'seed': seed,
+        'run_length': run_length,
+        'data': data_digest,
+        'vehicle_speed': Vehicle.speed,
+        'generation_frequency': Source.generation_frequency,
+        # only the thresholds of this scenario, so changing another scenario keeps this key
+        'breakdown_probabilities': breakdown_probabilities(scenario),
+    }
+    # only for runs that stop early, so the keys of full-length runs stay the same
+    if early_stop is not None:
+        parameters['early_stop'] = early_stop
+    return parameters
+
+
+# ---------------------------------------------------------------
+class ResultStore:
+    """
+    A directory of run results, one trip file (see trip_writer.py) per key
+
+    A result is first written to a temporary file and then moved into place, so a sweep
+    that is interrupted never leaves a half-written result behind; whatever is in the
+    store is complete and can be reused when the sweep is started again.
+
+    Attributes
+    __________
+    root: str
+        the directory the results are stored in
+
+    data_path: str
+        the network file the model reads; its contents are part of every key
+
+    code_digest: str
+        the digest of the source code of the model modules, part of every key
+    """
+
+    def __init__(self, root='../model/experiment/.store', data_path='../data/N1.csv'):
+        self.root = root
+        self.data_path = data_path
+        self.data_digest = file_digest(data_path)
+        self.code_digest = model_digest()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, scenario, seed, run_length, early_stop=None):
+        """
+        The key of a run: the hash of all its inputs
+        """
+        parameters = run_parameters(scenario, seed, run_length, self.data_digest, early_stop, self.code_digest)
+        encoded = json.dumps(parameters, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key + '.' + extension)
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, key, result_path, scenario, seed, run_length, early_stop=None):
+        """
+        Copy a finished result into the store, next to a json file with the inputs that produced it
+        """
+        with atomic_path(self.path(key)) as tmp_path:
+            shutil.copyfile(result_path, tmp_path)
+        with open(os.path.join(self.root, key + '.json'), 'w') as f:
+            json.dump(run_parameters(scenario, seed, run_length, self.data_digest, early_stop, self.code_digest), f,
+                      indent=2, sort_keys=True)
+
+    def get(self, key, result_path):
+        """
+        Copy a stored result to result_path
+        """
+        with atomic_path(result_path) as tmp_path:
+            shutil.copyfile(self.path(key), tmp_path)
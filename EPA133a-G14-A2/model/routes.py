@@ -0,0 +1,175 @@
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+    Route tables
+
+    A route is identified by an integer route id; its path is a compact array of infrastructure
+    indices (positions in the network's list of infra components), together with the cumulative
+    length along the path. The routes are computed the first time they are asked for, with the
+    path finder of the network, and kept in a bounded LRU cache keyed by (origin, destination),
+    so that asking for a route again is a dict lookup no matter how many sources and sinks there are.
+"""
+
+
+# ---------------------------------------------------------------
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+# ---------------------------------------------------------------
+class RouteTable:
+    """
+    Table of the routes of a network, with a bounded LRU cache of routes
+
+    The arrays of a route never change. A route id is never reused: a route that is evicted from
+    the cache and asked for again gets a new id, so vehicles that hold the path of an evicted route
+    can keep driving it. The arrays of an evicted route are dropped from the table, so the table
+    never holds more than cache_size routes.
+
+    Attributes
+    __________
+    infra_ids: array
+        the ids of all infra components; the position of an id is its infra index
+
+    lengths: array
+        the length of every infra component, by infra index
+
+    keys: dict
+        Key: route id
+        Value: the (origin, destination) ids of the route
+
+    paths: dict
+        Key: route id
+        Value: the infra indices of the path from origin to destination
+
+    starts, ends: dict
+        Key: route id
+        Value: the distance from the origin to the start and the end of every component on the path
+
+    find_path: callable
+        find_path(origin, destination) returns the infra ids on the path of a route that
+        is not in the table yet
+
+    cache_size: int
+        the maximum number of routes in the table; None for no limit
+    """
+
+    def __init__(self, infra_ids, lengths, paths=None, find_path=None, cache_size=None):
+        """
+        infra_ids, lengths: the ids and lengths of all infra components
+        paths: dict (origin, destination) -> the infra ids on the path, in order; routes to add right away
+        """
+        self.infra_ids = _read_only(np.asarray(infra_ids, dtype=np.int64))
+        self.lengths = _read_only(np.asarray(lengths, dtype=np.float64))
+        self.index = {infra_id: i for i, infra_id in enumerate(self.infra_ids.tolist())}
+        self.find_path = find_path
+        self.cache_size = cache_size
+        # Key: (origin, destination), Value: route id; from the least to the most recently used
+        self.route_ids = OrderedDict()
+        self.keys = {}
+        self.paths = {}
+        self.starts = {}
+        self.ends = {}
+        # the id of the next route that is added
+        self.next_route = 0
+        for key, path_ids in (paths or {}).items():
+            self.add(key, path_ids)
+
+    @classmethod
+    def from_arrays(cls, infra_ids, lengths, route_keys, route_offsets, route_paths, route_starts, route_ends,
+                    find_path=None, cache_size=None):
+        """
+        A route table on top of the flat arrays of RouteTable.arrays(), without copying them
+
+        The per-route paths, starts and ends are views into the flat arrays, so a table can be
+        built on arrays in shared memory
+        """
+        table = cls(infra_ids, lengths, find_path=find_path, cache_size=cache_size)
+        bounds = zip(route_offsets[:-1].tolist(), route_offsets[1:].tolist())
+        for key, (start, end) in zip(route_keys.tolist(), bounds):
+            table._append(tuple(key), _read_only(route_paths[start:end]),
+                          _read_only(route_starts[start:end]), _read_only(route_ends[start:end]))
+        return table
+
+    def arrays(self):
+        """
+        The routes in the cache as flat arrays: the infra ids and lengths, the (origin, destination)
+        of every route, and the paths, starts and ends of all routes one after the other, with the
+        offset of every route in them
+        """
+        routes = sorted(self.route_ids.values())
+        return {
+            'infra_ids': self.infra_ids,
+            'lengths': self.lengths,
+            'route_keys': np.array([self.keys[route] for route in routes], dtype=np.int64).reshape(-1, 2),
+            'route_offsets': np.cumsum([0] + [len(self.paths[route]) for route in routes], dtype=np.int64),
+            'route_paths': np.concatenate([self.paths[route] for route in routes] + [np.empty(0, np.int32)]),
+            'route_starts': np.concatenate([self.starts[route] for route in routes] + [np.empty(0)]),
+            'route_ends': np.concatenate([self.ends[route] for route in routes] + [np.empty(0)]),
+        }
+
+    def __len__(self):
+        return len(self.route_ids)
+
+    def add(self, key, path_ids):
+        """
+        Add the route (origin, destination) with the given infra ids on its path; returns its route id
+        """
+        path = np.array([self.index[infra_id] for infra_id in path_ids], dtype=np.int32)
+        path_ends = np.cumsum(self.lengths[path])
+        path_starts = np.concatenate(([0.0], path_ends[:-1]))
+        return self._append(key, _read_only(path), _read_only(path_starts), _read_only(path_ends))
+
+    def _append(self, key, path, path_starts, path_ends):
+        route = self.next_route
+        self.next_route += 1
+        self.keys[route] = key
+        self.paths[route] = path
+        self.starts[route] = path_starts
+        self.ends[route] = path_ends
+        self.route_ids[key] = route
+        if self.cache_size is not None and len(self.route_ids) > self.cache_size:
+            # evict the least recently used route
+            _, evicted = self.route_ids.popitem(last=False)
+            del self.keys[evicted], self.paths[evicted], self.starts[evicted], self.ends[evicted]
+        return route
+
+    def route(self, origin, destination):
+        """
+        The route id of the path from origin to destination (both infra ids)
+
+        A route that is not in the table yet is found with find_path and added
+        """
+        key = (origin, destination)
+        route = self.route_ids.get(key)
+        if route is not None:
+            self.route_ids.move_to_end(key)
+            return route
+        if self.find_path is None:
+            raise KeyError(key)
+        return self.add(key, self.find_path(origin, destination))
+
+    def path_ids(self, route):
+        """
+        The infra ids on the path of a route
+        """
+        return self.infra_ids[self.paths[route]]
+
+    def length(self, route):
+        """
+        The total length of a route
+        """
+        return self.ends[route][-1]
+
+    def locate(self, route, distance):
+        """
+        The (location_index, location_offset) on the path of a route at the given distance from the origin
+
+        A vehicle stays on a component up to and including its end, so the location is the
+        first component whose end is at or after the distance
+        """
+        location_index = int(np.searchsorted(self.ends[route], distance, side='left'))
+        return location_index, distance - self.starts[route][location_index]
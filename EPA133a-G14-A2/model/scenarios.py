@@ -0,0 +1,76 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from random_streams import RandomStreams
+
+"""
+    Table-driven scenario definitions
+
+    A scenario is a row of the scenario file: the breakdown probability (in %) of a bridge for
+    every condition. A bridge breaks down if its breakdown roll, a random number from 1 to 100,
+    is at most the probability of its condition in the scenario. The roll of a bridge only
+    depends on the seed, so one roll per bridge gives the broken bridges of every scenario.
+
+    New scenarios are added as new rows of the file, without any code changes.
+"""
+
+
+# ---------------------------------------------------------------
+@lru_cache(maxsize=None)
+def load_scenarios(path='../data/scenarios.csv'):
+    """
+    Read the scenario file once per process
+
+    Returns a dataframe indexed by scenario, with one column per bridge condition
+    holding the breakdown probability in %
+    """
+    return pd.read_csv(path, index_col='scenario')
+
+
+def breakdown_probabilities(scenario, path='../data/scenarios.csv'):
+    """
+    The breakdown probability (in %) per condition of one scenario, as a dict;
+    conditions that never break down in the scenario are left out
+    """
+    scenarios = load_scenarios(path)
+    if scenario not in scenarios.index:
+        raise ValueError(f"Scenario {scenario} is not defined in {path}")
+    return {condition: int(probability) for condition, probability in scenarios.loc[scenario].items() if probability}
+
+
+@lru_cache(maxsize=None)
+def breakdown_rolls(seed, bridge_ids):
+    """
+    The breakdown roll (1 to 100) of every bridge, each from the bridge's own random stream
+
+    bridge_ids: tuple
+        the ids of the bridges; the rolls are returned in the same order
+    """
+    streams = RandomStreams(seed)
+    return np.array([streams.generator(RandomStreams.BREAKDOWN, bridge_id).integers(1, 101)
+                     for bridge_id in bridge_ids], dtype=np.int64)
+
+
+def broken_matrix(seed, bridge_ids, conditions, path='../data/scenarios.csv'):
+    """
+    Which bridges are broken in which scenario, in one vectorized pass over the conditions
+
+    Returns a boolean dataframe with a row per scenario of the scenario file and a column per bridge
+    """
+    scenarios = load_scenarios(path)
+    rolls = breakdown_rolls(seed, tuple(bridge_ids))
+    # the probability of every scenario for the condition of every bridge; unknown conditions never break
+    probabilities = scenarios.reindex(columns=list(conditions), fill_value=0).to_numpy()
+    return pd.DataFrame(rolls <= probabilities, index=scenarios.index, columns=list(bridge_ids))
+
+
+def broken_bridges(seed, scenario, bridge_ids, conditions, path='../data/scenarios.csv'):
+    """
+    The boolean array of which of the bridges are broken in the given scenario
+    """
+    matrix = broken_matrix(seed, bridge_ids, conditions, path)
+    if scenario not in matrix.index:
+        raise ValueError(f"Scenario {scenario} is not defined in {path}")
+    return matrix.loc[scenario].to_numpy()
@@ -0,0 +1,153 @@
+import math
+
+import numpy as np
+
+from trip_stats import confidence_interval
+
+"""
+    Warm-up truncation and steady-state detection of the trip times of a run
+
+    At the start of a run the corridor is empty, and the first trips are not representative of the
+    steady state. mser finds the end of this warm-up in a series of trip times with the MSER-5 rule:
+    the series is cut into batches of 5 trips, and the warm-up is the number of batches whose removal
+    minimizes the squared standard error of the mean of the rest (White, 1997).
+
+    A SteadyStateMonitor applies the rule while the model runs. Every check_interval ticks it truncates
+    the warm-up and computes the confidence interval of the steady-state mean trip time from batch means;
+    once it is narrow enough, the model stops (model.running = False), instead of always running the
+    full run length.
+"""
+
+
+# ---------------------------------------------------------------
+def mser(values, batch_size=5, max_fraction=0.5):
+    """
+    The number of values at the start of the series that are warm-up, by the MSER rule on batch means
+
+    Only truncation points in the first max_fraction of the series are considered, since the
+    statistic is not reliable near the end of the series. With batch_size 5 this is MSER-5.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    number_of_batches = len(values) // batch_size
+    if number_of_batches < 2:
+        return 0
+    means = values[:number_of_batches * batch_size].reshape(number_of_batches, batch_size).mean(axis=1)
+    # for every truncation point d, the number, sum and sum of squares of the batch means from d on
+    remaining = np.arange(number_of_batches, 0, -1)
+    totals = np.cumsum(means[::-1])[::-1]
+    squares = np.cumsum(means[::-1] ** 2)[::-1]
+    statistic = (squares - totals ** 2 / remaining) / remaining ** 2
+    last = max(1, int(number_of_batches * max_fraction))
+    return int(np.argmin(statistic[:last])) * batch_size
+
+
+# ---------------------------------------------------------------
+class SteadyStateMonitor:
+    """
+    Detects the warm-up and the convergence of the mean trip time while the model runs
+
+    BangladeshModel(..., steady_state=monitor) records every trip in the monitor and stops the
+    model at the first check at which the steady state has converged
+
+    Attributes
+    __________
+    tolerance: float
+        the largest accepted half-width of the confidence interval of the steady-state mean trip time,
+        as a fraction of the mean
+
+    confidence: float
+        the confidence level of the interval
+
+    batch_size: int
+        the number of trips per batch mean (5 for MSER-5)
+
+    number_of_batches: int
+        the number of (larger) batches the steady-state part is cut into for the confidence interval,
+        so that the batch means are about independent although consecutive trips are not
+
+    min_trips: int
+        the least number of steady-state trips before the model may stop
+
+    check_interval: int
+        the number of ticks between two checks
+
+    warmup: int
+        the number of trips that were warm-up at the last check
+
+    warmup_tick: int
+        the tick at which the last warm-up trip ended; None without warm-up
+
+    mean, half_width: float
+        the steady-state mean trip time and the half-width of its confidence interval at the last check
+
+    stopped_at: int
+        the tick at which the steady state was found to have converged; None before that
+    """
+
+    def __init__(self, tolerance=0.01, confidence=0.95, batch_size=5, number_of_batches=20, min_trips=500,
+                 check_interval=60):
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.batch_size = batch_size
+        self.number_of_batches = number_of_batches
+        self.min_trips = min_trips
+        self.check_interval = check_interval
+        # the mean trip time of every full batch, and the tick at which its last trip ended
+        self.batch_means = []
+        self.batch_ends = []
+        self._batch_total = 0.0
+        self._batch_count = 0
+        self.next_check = check_interval
+        self.warmup = 0
+        self.warmup_tick = None
+        self.mean = math.nan
+        self.half_width = math.nan
+        self.stopped_at = None
+
+    def record(self, travel_time, tick):
+        """
+        Add the trip time of a trip that ended at the given tick
+        """
+        self._batch_total += travel_time
+        self._batch_count += 1
+        if self._batch_count == self.batch_size:
+            self.batch_means.append(self._batch_total / self.batch_size)
+            self.batch_ends.append(tick)
+            self._batch_total = 0.0
+            self._batch_count = 0
+
+    def record_many(self, travel_times, tick):
+        """
+        Add the trip times of several trips that ended at the given tick, in order
+        """
+        for travel_time in np.asarray(travel_times).tolist():
+            self.record(travel_time, tick)
+
+    def check(self, tick):
+        """
+        Check the steady state once `tick` ticks are done; returns True if the model can stop
+
+        Nothing is computed before the next check is due
+        """
+        if self.stopped_at is not None:
+            return True
+        if tick < self.next_check:
+            return False
+        check_tick = self.next_check
+        self.next_check = (tick // self.check_interval + 1) * self.check_interval
+
+        # the batch means are already batches of batch_size trips
+        warmup_batches = mser(self.batch_means, batch_size=1)
+        self.warmup = warmup_batches * self.batch_size
+        self.warmup_tick = self.batch_ends[warmup_batches - 1] if warmup_batches else None
+        steady = np.asarray(self.batch_means[warmup_batches:])
+        if len(steady) * self.batch_size < self.min_trips or len(steady) < self.number_of_batches:
+            return False
+        # cut the steady-state part into number_of_batches equal batches, dropping the oldest means that do not fit
+        size = len(steady) // self.number_of_batches
+        batches = steady[len(steady) - size * self.number_of_batches:].reshape(self.number_of_batches, size)
+        self.mean, self.half_width = confidence_interval(batches.mean(axis=1), self.confidence)
+        if self.half_width <= self.tolerance * abs(self.mean):
+            self.stopped_at = check_tick
+            return True
+        return False
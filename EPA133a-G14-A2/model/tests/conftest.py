@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+"""
+    Shared setup of the tests
+
+    The model modules import each other as top-level modules and read their data with paths relative
+    to the model directory (e.g. '../data/N1.csv'), as when model_run.py is started from there. The
+    tests therefore put the model directory on the import path and run from it.
+"""
+
+model_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if model_dir not in sys.path:
+    sys.path.insert(0, model_dir)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def in_model_dir():
+    cwd = os.getcwd()
+    os.chdir(model_dir)
+    yield
+    os.chdir(cwd)
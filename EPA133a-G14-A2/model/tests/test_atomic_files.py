@@ -0,0 +1,58 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import network
+from atomic_files import atomic_path
+
+"""
+    Atomic writes: a file is only replaced when it is complete, and every writer has its own temporary file
+"""
+
+
+def test_replaces_on_success(tmp_path):
+    path = tmp_path / 'out' / 'file.txt'
+    with atomic_path(str(path)) as tmp:
+        with open(tmp, 'w') as f:
+            f.write('new')
+        assert not path.exists()
+    assert path.read_text() == 'new'
+    assert os.listdir(path.parent) == ['file.txt']
+
+
+def test_keeps_file_on_failure(tmp_path):
+    path = tmp_path / 'file.txt'
+    path.write_text('old')
+    with pytest.raises(RuntimeError):
+        with atomic_path(str(path)) as tmp:
+            with open(tmp, 'w') as f:
+                f.write('half')
+            raise RuntimeError('interrupted')
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['file.txt']
+
+
+def test_writers_have_their_own_temporary_file(tmp_path):
+    path = str(tmp_path / 'file.txt')
+    with atomic_path(path) as first, atomic_path(path) as second:
+        assert first != second
+        for tmp, text in ((first, 'first'), (second, 'second')):
+            with open(tmp, 'w') as f:
+                f.write(text)
+    # the inner block ends first, so the outer writer is the last to finish
+    with open(path) as f:
+        assert f.read() == 'first'
+
+
+def test_parallel_cache_rebuild(tmp_path):
+    data_path = str(tmp_path / 'N1.csv')
+    shutil.copyfile('../data/N1.csv', data_path)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(network.read_columns, [data_path] * 8))
+    for arrays in results:
+        np.testing.assert_array_equal(arrays['id'], results[0]['id'])
+    assert sorted(os.listdir(tmp_path)) == sorted(['N1.csv', os.path.basename(network.cache_path(data_path))])
+    np.testing.assert_array_equal(network.read_columns(data_path)['id'], results[0]['id'])
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from batch_run import run_batch, output_path
+from trip_writer import read_trips
+
+"""
+    A sweep gives the same output files whether its jobs run one after the other or in parallel
+"""
+
+# no broken bridges and some; long enough for every job to have trips
+scenarios = [0, 4]
+seeds = [1234567, 42]
+run_length = 1000
+
+
+def sweep(output_dir, workers):
+    failed = run_batch(scenarios, seeds, run_length, output_dir=str(output_dir), workers=workers)
+    assert failed == {}
+    files = {}
+    for scenario in scenarios:
+        for seed in seeds:
+            with open(output_path(str(output_dir), scenario, seed), 'rb') as f:
+                files[scenario, seed] = f.read()
+    return files
+
+
+@pytest.mark.parametrize('workers', [2, 4])
+def test_parallel_sweep_matches_serial(tmp_path, workers):
+    serial = sweep(tmp_path / 'serial', workers=1)
+    parallel = sweep(tmp_path / 'parallel', workers=workers)
+    for scenario, seed in serial:
+        assert len(read_trips(output_path(str(tmp_path / 'serial'), scenario, seed))) > 0
+    assert parallel == serial
+    # no temporary files are left behind
+    for root, directories, names in os.walk(tmp_path):
+        assert not [name for name in names if '.tmp' in name]
@@ -0,0 +1,61 @@
+import numpy as np
+
+from bridge_delays import BridgeDelays
+from components import Bridge
+from model import BangladeshModel
+from random_streams import RandomStreams
+
+"""
+    The delay table of a whole run is the same as the delays drawn tick by tick, and the delays
+    of a bridge do not depend on which other bridges are broken
+"""
+
+# one bridge of every delay distribution, and a number of bridges that is not a whole Philox block
+lengths = [5.0, 30.0, 120.0, 400.0, 8.0, 60.0, 250.0]
+run_length = 200
+
+
+def make_delays():
+    return BridgeDelays(RandomStreams(1234567).key(RandomStreams.DELAYS), lengths)
+
+
+def test_table_matches_at_tick():
+    table = make_delays().table(run_length)
+    delays = make_delays()
+    assert table.shape == (run_length, len(lengths))
+    for tick in range(run_length):
+        np.testing.assert_array_equal(delays.at_tick(tick), table[tick])
+
+
+def test_at_tick_in_any_order():
+    table = make_delays().table(run_length)
+    delays = make_delays()
+    ticks = np.random.default_rng(0).permutation(run_length).tolist()
+    # backwards, skipping ticks, and asking for the same tick twice
+    for tick in ticks + [ticks[-1], run_length - 1, 0]:
+        np.testing.assert_array_equal(delays.at_tick(tick), table[tick])
+        assert delays.delay(3, tick) == table[tick, 3]
+
+
+def test_delays_within_distribution():
+    table = make_delays().table(run_length)
+    low = np.array([10, 15, 45, 60, 10, 45, 60])
+    high = np.array([20, 60, 90, 240, 20, 90, 240])
+    assert (table >= low).all() and (table <= high).all()
+
+
+def broken_bridge_delays(scenario, seed=1234567, ticks=100, **kwargs):
+    model = BangladeshModel(seed=seed, scenario=scenario, **kwargs)
+    broken = [agent for agent in model.infra if isinstance(agent, Bridge) and agent.delay_time != 0]
+    return {bridge.unique_id: [model.bridge_delays.delay(bridge.delay_index, tick) for tick in range(ticks)]
+            for bridge in broken}
+
+
+def test_delays_independent_of_broken_set():
+    few, many = broken_bridge_delays(4), broken_bridge_delays(8)
+    merged = broken_bridge_delays(8, merge_intact_bridges=True)
+    # the bridges that break in scenario 4 also break in scenario 8, along with many others
+    assert few and set(few) < set(many)
+    for bridge_id, delays in few.items():
+        assert many[bridge_id] == delays
+    assert merged == many
@@ -0,0 +1,151 @@
+from functools import lru_cache
+
+import pandas as pd
+import pytest
+from mesa.time import BaseScheduler
+
+import analytic
+from model import BangladeshModel
+from active_scheduler import ActiveScheduler, FastForwardScheduler
+from event_engine import EventDrivenModel
+from vectorized import VectorizedModel
+from steady_state import SteadyStateMonitor
+
+"""
+    All engines, schedulers and networks give exactly the same trips
+
+    The reference is BangladeshModel stepped by Mesa's BaseScheduler, which steps every agent every
+    tick, as the model originally did. One short run per scenario family: no broken bridges (0), some (4)
+    and many (8).
+"""
+
+seed = 1234567
+run_length = 1500
+scenario_families = [0, 4, 8]
+
+
+class BaseSchedulerModel(BangladeshModel):
+    schedule_class = BaseScheduler
+
+
+class ActiveSchedulerModel(BangladeshModel):
+    schedule_class = ActiveScheduler
+
+
+class FastForwardModel(BangladeshModel):
+    schedule_class = FastForwardScheduler
+
+
+def step_trips(model_class, scenario, **kwargs):
+    """
+    The trips of a run of run_length steps, sorted by truck
+    """
+    model = model_class(seed=seed, scenario=scenario, trip_log=True, **kwargs)
+    for _ in range(run_length):
+        model.step()
+    return model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+
+
+def run_trips(model_class, scenario, **kwargs):
+    model = model_class(seed=seed, scenario=scenario, **kwargs)
+    model.run(run_length)
+    return model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+
+
+@lru_cache(maxsize=None)
+def reference_trips(scenario):
+    return step_trips(BaseSchedulerModel, scenario)
+
+
+# ---------------------------------------------------------------
+@pytest.mark.parametrize('scenario', scenario_families)
+def test_reference_has_trips(scenario):
+    assert len(reference_trips(scenario)) > 0
+
+
+@pytest.mark.parametrize('scenario', scenario_families)
+@pytest.mark.parametrize('model_class', [BangladeshModel, ActiveSchedulerModel])
+def test_schedulers(model_class, scenario):
+    pd.testing.assert_frame_equal(step_trips(model_class, scenario), reference_trips(scenario))
+
+
+@pytest.mark.parametrize('scenario', scenario_families)
+@pytest.mark.parametrize('model_class', [EventDrivenModel, VectorizedModel])
+def test_engines(model_class, scenario):
+    pd.testing.assert_frame_equal(run_trips(model_class, scenario), reference_trips(scenario))
+
+
+@pytest.mark.parametrize('model_class', [EventDrivenModel, VectorizedModel])
+@pytest.mark.parametrize('trip_log', [True, False])
+def test_engines_accept_trip_log(model_class, trip_log):
+    # the engines always keep a trip log; passing trip_log, as to BangladeshModel, is allowed
+    model = model_class(seed=seed, scenario=4, trip_log=trip_log)
+    model.run(run_length)
+    pd.testing.assert_frame_equal(model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True),
+                                  reference_trips(4))
+
+
+def early_stop_run(model_class, max_length=5000):
+    """
+    A run that stops once the steady-state mean trip time has converged; the trips and the tick it stopped at
+    """
+    model = model_class(seed=seed, scenario=4, trip_log=True, steady_state=SteadyStateMonitor(tolerance=0.02))
+    if model_class is BangladeshModel:
+        # stepped as batch_run.run_job does
+        while model.running and model.schedule.steps < max_length:
+            model.step()
+    else:
+        model.run(max_length)
+    trips = model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+    return trips, model.steady_state.stopped_at, model.schedule.steps
+
+
+def test_steady_state_early_stop():
+    trips, stopped_at, steps = early_stop_run(BangladeshModel)
+    assert stopped_at == steps == 2100
+    assert trips['removed_at_step'].max() < stopped_at
+    for model_class in (EventDrivenModel, VectorizedModel):
+        engine_trips, engine_stopped_at, engine_steps = early_stop_run(model_class)
+        assert engine_stopped_at == engine_steps == stopped_at
+        pd.testing.assert_frame_equal(engine_trips, trips)
+
+
+@pytest.mark.parametrize('scenario', scenario_families)
+def test_analytic(scenario):
+    trips = analytic.simulate(scenario, seed, run_length).to_dataframe()
+    pd.testing.assert_frame_equal(trips, reference_trips(scenario))
+
+
+@pytest.mark.parametrize('scenario', scenario_families)
+@pytest.mark.parametrize('merge', [{'merge_links': True}, {'merge_intact_bridges': True}])
+def test_merged_networks(merge, scenario):
+    pd.testing.assert_frame_equal(step_trips(BangladeshModel, scenario, **merge), reference_trips(scenario))
+    pd.testing.assert_frame_equal(run_trips(EventDrivenModel, scenario, **merge), reference_trips(scenario))
+    pd.testing.assert_frame_equal(run_trips(VectorizedModel, scenario, **merge), reference_trips(scenario))
+
+
+def test_analytic_validate():
+    result = analytic.validate(4, seed, run_length)
+    assert result['identical']
+    assert result['ks statistic'] == 0
+
+
+def test_scheduler_choice():
+    assert type(BangladeshModel(seed=seed, scenario=0, trip_log=True).schedule) is FastForwardScheduler
+    assert type(BangladeshModel(seed=seed, scenario=0, trip_stats=True).schedule) is FastForwardScheduler
+    assert type(BangladeshModel(seed=seed, scenario=0).schedule) is ActiveScheduler
+
+
+def test_datacollector_output():
+    """
+    The per-tick DataCollector output does not depend on the scheduler (the sleeping vehicles of
+    the FastForwardScheduler are caught up before every collect)
+    """
+    frames = []
+    for model_class in (BaseSchedulerModel, BangladeshModel, FastForwardModel):
+        model = model_class(seed=seed, scenario=8)
+        for _ in range(600):
+            model.step()
+        frames.append(model.datacollector.get_agent_vars_dataframe())
+    pd.testing.assert_frame_equal(frames[0], frames[1])
+    pd.testing.assert_frame_equal(frames[0], frames[2])
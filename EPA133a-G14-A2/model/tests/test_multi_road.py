@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+from mesa.time import BaseScheduler
+
+from model import BangladeshModel
+from event_engine import EventDrivenModel
+from vectorized import VectorizedModel
+from network import Network, read_columns
+
+"""
+    Two roads joined at an intersection
+
+    Road A runs from sourcesink 1 to sourcesink 7 and road B from sourcesink 11 to sourcesink 16. They
+    cross at intersection 5, which is listed on both roads with the same id (see ../data/README.md).
+"""
+
+rows = [
+    # road, id, model_type, name, lat, lon, length, condition
+    ('A', 1, 'sourcesink', 'sourcesink', 23.70, 90.40, 0, ''),
+    ('A', 2, 'link', 'link 1', 23.71, 90.41, 1000, ''),
+    ('A', 3, 'bridge', 'bridge 1', 23.72, 90.42, 50, 'D'),
+    ('A', 4, 'link', 'link 2', 23.73, 90.43, 1000, ''),
+    ('A', 5, 'intersection', 'intersection A-B', 23.74, 90.44, 10, ''),
+    ('A', 6, 'link', 'link 3', 23.75, 90.45, 1000, ''),
+    ('A', 7, 'sourcesink', 'sourcesink', 23.76, 90.46, 0, ''),
+    ('B', 11, 'sourcesink', 'sourcesink', 23.60, 90.50, 0, ''),
+    ('B', 12, 'link', 'link 1', 23.65, 90.48, 2000, ''),
+    ('B', 5, 'intersection', 'intersection A-B', 23.74, 90.44, 10, ''),
+    ('B', 13, 'link', 'link 2', 23.78, 90.42, 500, ''),
+    ('B', 14, 'bridge', 'bridge 1', 23.80, 90.41, 20, 'C'),
+    ('B', 15, 'link', 'link 3', 23.82, 90.40, 700, ''),
+    ('B', 16, 'sourcesink', 'sourcesink', 23.84, 90.39, 0, ''),
+]
+roads = ('A', 'B')
+seed = 1234567
+run_length = 3000
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'two_roads.csv'
+    pd.DataFrame(rows, columns=['road', 'id', 'model_type', 'name', 'lat', 'lon', 'length', 'condition']).to_csv(
+        path, index=False)
+    return str(path)
+
+
+class BaseSchedulerModel(BangladeshModel):
+    schedule_class = BaseScheduler
+
+
+def test_roads_are_joined(data_path):
+    network = Network.from_columns(data_path, roads, read_columns(data_path))
+    # the intersection is one component
+    assert len(network) == len(rows) - 1
+    assert len(set(network.component.tolist())) == 1
+    assert sorted(network.destinations(1)) == [7, 11, 16]
+    assert network.shortest_path(1, 16) == [1, 2, 3, 4, 5, 13, 14, 15, 16]
+    assert network.shortest_path(7, 11) == [7, 6, 5, 12, 11]
+
+
+def test_separate_roads_are_not_joined(data_path):
+    network = Network.from_columns(data_path, ('A',), read_columns(data_path))
+    assert network.destinations(1) == [7]
+
+
+def test_trips_cross_roads(data_path):
+    model = BangladeshModel(seed=seed, scenario=8, data_path=data_path, roads=roads, trip_log=True)
+    for _ in range(run_length):
+        model.step()
+    trips = model.trip_log.to_dataframe()
+    road_a, road_b = {1, 7}, {11, 16}
+    crossing = trips[trips['origin'].isin(road_a) & trips['destination'].isin(road_b)]
+    assert len(crossing) > 0
+    # from sourcesink 1 to 16 is 4060 m; at 50 km/h (833 m per tick) at least 5 ticks
+    from_1_to_16 = trips[(trips['origin'] == 1) & (trips['destination'] == 16)]
+    assert len(from_1_to_16) > 0 and (from_1_to_16['driving_time'] >= 5).all()
+
+
+@pytest.mark.parametrize('merge', [{}, {'merge_links': True}, {'merge_intact_bridges': True}])
+def test_engines_on_two_roads(data_path, merge):
+    def trips(model):
+        return model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+
+    reference = BaseSchedulerModel(seed=seed, scenario=8, data_path=data_path, roads=roads, trip_log=True)
+    stepped = BangladeshModel(seed=seed, scenario=8, data_path=data_path, roads=roads, trip_log=True, **merge)
+    for _ in range(run_length):
+        reference.step()
+        stepped.step()
+    pd.testing.assert_frame_equal(trips(stepped), trips(reference))
+    for model_class in (EventDrivenModel, VectorizedModel):
+        model = model_class(seed=seed, scenario=8, data_path=data_path, roads=roads, **merge)
+        model.run(run_length)
+        pd.testing.assert_frame_equal(trips(model), trips(reference))
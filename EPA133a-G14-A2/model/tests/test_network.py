@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import network
+from model import BangladeshModel
+from network import load_network, SharedNetwork, attach
+
+"""
+    Coarsened networks: what they merge, and how many a network keeps; and a network shared with worker processes
+"""
+
+
+def test_merge_links_on_n1_merges_nothing():
+    """
+    On N1 the links alternate with bridges, so there are no chains of links to merge
+    """
+    full = load_network()
+    coarse = full.coarsened(full.model_type == 'link')
+    assert len(coarse) == len(full)
+    np.testing.assert_array_equal(coarse.length, full.length)
+
+
+def test_merge_bridges_keeps_lengths():
+    full = load_network()
+    mergeable = np.isin(full.model_type, ('link', 'bridge'))
+    coarse = full.coarsened(mergeable)
+    assert len(coarse) < len(full)
+    assert coarse.length.sum() == pytest.approx(full.length.sum())
+    assert set(coarse.id.tolist()) >= set(full.sources)
+
+
+def test_coarsened_networks_are_bounded():
+    full = load_network()
+    is_bridge = np.flatnonzero(full.model_type == 'bridge')
+    masks = []
+    for i in range(network.coarsened_cache_size + 3):
+        mergeable = full.model_type == 'link'
+        mergeable[is_bridge[i::7]] = True
+        masks.append(mergeable)
+        full.coarsened(mergeable)
+        assert len(full._coarsened) <= network.coarsened_cache_size
+    # the most recently used one is still shared
+    assert full.coarsened(masks[-1]) is full.coarsened(masks[-1].copy())
+
+
+# ---------------------------------------------------------------
+def shared_run(scenario):
+    """
+    A run in a worker process that attached to a SharedNetwork; its trips, and whether it built the graph
+    """
+    shared = load_network()
+    model = BangladeshModel(seed=1234567, scenario=scenario, trip_log=True)
+    for _ in range(1000):
+        model.step()
+    arrays = {name: np.array(array) for name, array in shared.arrays().items()}
+    return model.trip_log.to_dataframe(), 'graph' in vars(shared), arrays
+
+
+@pytest.mark.parametrize('scenario', [0, 4])
+def test_attached_network(scenario):
+    full = load_network()
+    with SharedNetwork(full) as shared, \
+            ProcessPoolExecutor(max_workers=1, initializer=attach, initargs=(shared.layout,)) as executor:
+        trips, built_graph, arrays = executor.submit(shared_run, scenario).result()
+    # the worker found every route and connected sink in the shared arrays
+    assert not built_graph
+    for name, array in full.arrays().items():
+        np.testing.assert_array_equal(arrays[name], array)
+
+    model = BangladeshModel(seed=1234567, scenario=scenario, trip_log=True)
+    for _ in range(1000):
+        model.step()
+    assert len(trips) > 0
+    pd.testing.assert_frame_equal(trips, model.trip_log.to_dataframe())
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import batch_run
+import profiling
+from model import BangladeshModel
+from components import Vehicle
+from event_engine import EventDrivenModel
+from vectorized import VectorizedModel
+
+"""
+    The opt-in profiler: the same trips, a root row for every engine, and no timers left behind
+"""
+
+seed = 1234567
+run_length = 300
+
+
+def is_wrapped():
+    return profiling._profilers > 0 or hasattr(vars(Vehicle)['drive'], '__wrapped__')
+
+
+def trips(model):
+    return model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+
+
+def test_profiled_run_gives_the_same_trips():
+    plain = BangladeshModel(seed=seed, scenario=8, trip_log=True)
+    profiled = BangladeshModel(seed=seed, scenario=8, trip_log=True, profile=True)
+    with profiled.profiler:
+        for _ in range(run_length):
+            plain.step()
+            profiled.step()
+    pd.testing.assert_frame_equal(trips(plain), trips(profiled))
+    assert not is_wrapped()
+
+    table = profiled.profiler.table()
+    root = table[(table['class'] == 'BangladeshModel') & (table['method'] == 'step')]
+    assert root['calls'].tolist() == [run_length]
+    assert root['share'].tolist() == [1.0]
+
+
+def test_datacollector_reporters_are_timed():
+    model = BangladeshModel(seed=seed, scenario=0, profile=True)
+    with model.profiler:
+        for _ in range(10):
+            model.step()
+    calls = model.profiler.calls
+    # once per agent per tick: the infrastructure and the vehicles on the road
+    assert calls['DataCollector', 'Delay time'] > 10 * len(model.infra)
+    assert calls['DataCollector', 'Driving time of cars leaving'] == calls['DataCollector', 'Delay time']
+
+
+@pytest.mark.parametrize('model_class, root', [(VectorizedModel, 'run'), (EventDrivenModel, 'run')])
+def test_engines_have_a_root_row(model_class, root):
+    model = model_class(seed=seed, scenario=8, profile=True)
+    with model.profiler:
+        model.run(run_length)
+    table = model.profiler.table().set_index(['class', 'method'])
+    assert table.loc[(model_class.__name__, root), 'share'] == 1.0
+    assert (table['share'] <= 1.0).all()
+
+
+def test_failing_job_removes_the_timers(tmp_path, monkeypatch):
+    def fail(self):
+        raise RuntimeError('failing run')
+
+    monkeypatch.setattr(BangladeshModel, 'flush_trips', fail)
+    with pytest.raises(RuntimeError):
+        batch_run.run_job(0, seed, 10, str(tmp_path), profile=True)
+    assert not is_wrapped()
@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+
+import replications
+from replications import run_adaptive
+
+"""
+    The stopping rule of run_adaptive, on made-up run results
+
+    run_jobs and run_mean are replaced, so no model runs: every (scenario, seed) job either fails,
+    gives a run without finished trips (NaN), or gives the mean trip time listed below
+"""
+
+seed_list = list(range(1, 11))
+failing = {(1, 1), (1, 2)}
+
+
+def fake_mean(scenario, seed):
+    if scenario == 0:
+        # no spread at all
+        return 100.0
+    if scenario == 1:
+        # the first two seeds fail, the rest has a little spread
+        return 100.0 + seed % 2
+    if scenario == 2:
+        # no trip ever finishes
+        return math.nan
+    # much spread
+    return float(np.random.default_rng(seed).normal(100, 40))
+
+
+def run(monkeypatch, scenario_list):
+    ran = []
+
+    def run_jobs(jobs, *args):
+        ran.extend(jobs)
+        return {job: RuntimeError('failed') for job in jobs if job in failing}
+
+    monkeypatch.setattr(replications, 'run_jobs', run_jobs)
+    monkeypatch.setattr(replications, 'run_mean', lambda output_dir, scenario, seed: fake_mean(scenario, seed))
+    summary, failed = run_adaptive(scenario_list, seed_list, run_length=100, target=0.05, min_replications=3)
+    return summary, failed, ran
+
+
+def test_converges_after_min_replications(monkeypatch):
+    summary, failed, ran = run(monkeypatch, [0])
+    assert ran == [(0, 1), (0, 2), (0, 3)]
+    assert summary.loc[0, 'converged'] and summary.loc[0, 'status'] == 'converged'
+    assert summary.loc[0, 'relative_half_width'] == 0
+
+
+def test_failed_runs_get_more_seeds(monkeypatch):
+    summary, failed, ran = run(monkeypatch, [1])
+    assert set(failed) == failing
+    # only seed 3 counted after the first round; the scenario is not left without an interval
+    assert summary.loc[1, 'replications'] >= 2
+    assert summary.loc[1, 'converged']
+    assert summary.loc[1, 'seeds'] == summary.loc[1, 'replications'] + 2
+
+
+def test_gives_up_only_when_seeds_are_exhausted(monkeypatch, capsys):
+    summary, failed, ran = run(monkeypatch, [0, 2, 3])
+    assert [seed for scenario, seed in ran if scenario == 2] == seed_list
+    assert summary.loc[2, 'status'] == 'too few runs' and not summary.loc[2, 'converged']
+    assert summary.loc[2, 'seeds'] == len(seed_list) and summary.loc[2, 'replications'] == 0
+    assert summary.loc[3, 'status'] == 'seeds exhausted' and summary.loc[3, 'seeds'] == len(seed_list)
+    output = capsys.readouterr().out
+    assert 'scenario 2 did not converge' in output
+    assert 'scenario 3 did not converge' in output
+    assert 'scenario 0 did not converge' not in output
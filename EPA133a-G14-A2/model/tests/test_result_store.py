@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import pytest
+
+import result_store
+from result_store import ResultStore
+from components import Vehicle, Source
+
+"""
+    A result store key changes with every input of a run, and only then
+"""
+
+run = dict(scenario=4, seed=1234567, run_length=7200)
+
+
+@pytest.fixture
+def store(tmp_path):
+    data_path = tmp_path / 'N1.csv'
+    shutil.copyfile('../data/N1.csv', data_path)
+    return ResultStore(str(tmp_path / 'store'), data_path=str(data_path))
+
+
+def key(store, **changes):
+    return store.key(**dict(run, **changes))
+
+
+def test_same_inputs_same_key(store, tmp_path):
+    assert key(store) == key(store)
+    other = ResultStore(str(tmp_path / 'other'), data_path=store.data_path)
+    assert key(other) == key(store)
+
+
+@pytest.mark.parametrize('changes', [{'scenario': 5}, {'seed': 1234568}, {'run_length': 7201},
+                                     {'early_stop': 0.01}])
+def test_run_inputs_change_key(store, changes):
+    assert key(store, **changes) != key(store)
+
+
+def test_model_parameters_change_key(store, monkeypatch):
+    reference = key(store)
+    monkeypatch.setattr(Vehicle, 'speed', Vehicle.speed * 2)
+    assert key(store) != reference
+    monkeypatch.undo()
+    monkeypatch.setattr(Source, 'generation_frequency', Source.generation_frequency + 1)
+    assert key(store) != reference
+
+
+def test_scenario_definition_changes_key(store, monkeypatch):
+    reference = key(store)
+    monkeypatch.setattr(result_store, 'breakdown_probabilities', lambda scenario: {'D': 99})
+    assert key(store) != reference
+
+
+def test_network_file_changes_key(store, tmp_path):
+    reference = key(store)
+    with open(store.data_path, 'a') as f:
+        f.write('\n')
+    assert key(ResultStore(str(tmp_path / 'store'), data_path=store.data_path)) != reference
+
+
+@pytest.mark.parametrize('changed', ['components.py', 'batch_run.py', 'vectorized.py'])
+def test_model_code_changes_key(store, tmp_path, monkeypatch, changed):
+    reference = key(store)
+    # a copy of the model modules with one of them changed
+    code_dir = tmp_path / 'code'
+    code_dir.mkdir()
+    for name in result_store.model_modules:
+        shutil.copyfile(name, code_dir / name)
+    with open(code_dir / changed, 'a') as f:
+        f.write('\n')
+    monkeypatch.setattr(store, 'code_digest', result_store.model_digest(str(code_dir)))
+    assert key(store) != reference
+
+
+def test_put_and_get(store, tmp_path):
+    result = tmp_path / 'result.csv'
+    result.write_text('trips\n')
+    run_key = key(store)
+    assert run_key not in store
+    store.put(run_key, str(result), **run)
+    assert run_key in store
+    copy = tmp_path / 'copy' / 'result.csv'
+    store.get(run_key, str(copy))
+    assert copy.read_text() == 'trips\n'
+    assert os.path.exists(os.path.join(store.root, run_key + '.json'))
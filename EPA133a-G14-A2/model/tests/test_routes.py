@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+import analytic
+from model import BangladeshModel
+from routes import RouteTable
+
+"""
+    The LRU route cache: eviction, new ids for evicted routes, and vehicles that keep driving their path
+"""
+
+
+def line_table(cache_size):
+    """
+    A route table of six components in a line, ids 10 .. 15, each 100 long
+    """
+    infra_ids = list(range(10, 16))
+
+    def find_path(origin, destination):
+        step = 1 if destination >= origin else -1
+        return list(range(origin, destination + step, step))
+
+    return RouteTable(infra_ids, [100.0] * len(infra_ids), find_path=find_path, cache_size=cache_size)
+
+
+def test_route_is_cached():
+    table = line_table(cache_size=None)
+    route = table.route(10, 13)
+    assert table.route(10, 13) == route
+    np.testing.assert_array_equal(table.path_ids(route), [10, 11, 12, 13])
+    np.testing.assert_array_equal(table.ends[route], [100, 200, 300, 400])
+    assert table.length(route) == 400
+    assert table.locate(route, 250) == (2, 50)
+    # a vehicle stays on a component up to and including its end
+    assert table.locate(route, 200) == (1, 100)
+
+
+def test_least_recently_used_route_is_evicted():
+    table = line_table(cache_size=2)
+    first = table.route(10, 15)
+    second = table.route(11, 15)
+    # using the first route makes the second the least recently used
+    assert table.route(10, 15) == first
+    table.route(12, 15)
+    assert len(table) == 2
+    assert set(table.route_ids) == {(10, 15), (12, 15)}
+    # an evicted route gets a new id when it is asked for again
+    assert table.route(11, 15) != second
+    assert len(table) == 2
+
+
+def test_evicted_routes_are_dropped():
+    table = line_table(cache_size=3)
+    held = table.paths[table.route(10, 15)]
+    for origin in range(10, 16):
+        for destination in range(10, 16):
+            table.route(origin, destination)
+    assert len(table.keys) == len(table.paths) == len(table.starts) == len(table.ends) == 3
+    assert len(table) == 3 and table.next_route > 3
+    # the path of an evicted route is untouched for whoever still holds it
+    np.testing.assert_array_equal(held, [0, 1, 2, 3, 4, 5])
+
+
+def test_vehicles_keep_evicted_paths():
+    """
+    With a cache of two routes almost every new truck evicts a route that trucks on the road still
+    drive; the trips are the same as without a limit
+    """
+    scenario, seed, run_length = 4, 1234567, 1500
+    model = BangladeshModel(seed=seed, scenario=scenario, trip_log=True)
+    shared = model.route_table
+    model.route_table = RouteTable(shared.infra_ids, shared.lengths, find_path=model.network.shortest_path,
+                                   cache_size=2)
+    for _ in range(run_length):
+        model.step()
+    assert len(model.route_table) == 2
+    trips = model.trip_log.to_dataframe().sort_values('truck_id', ignore_index=True)
+    pd.testing.assert_frame_equal(trips, analytic.simulate(scenario, seed, run_length).to_dataframe())
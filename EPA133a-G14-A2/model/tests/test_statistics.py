@@ -0,0 +1,201 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model import BangladeshModel
+from vectorized import VectorizedModel
+from steady_state import mser
+from trip_stats import t_quantile, confidence_interval, RunningStats, QuantileSketch
+
+"""
+    The statistics helpers against NumPy and tabulated values, and the trip statistics of a run
+    against its trip log
+"""
+
+# the 97.5% and 99.5% quantiles of Student's t distribution, by degrees of freedom
+t_table = {
+    1: (12.7062047, 63.6567412),
+    2: (4.3026527, 9.9248432),
+    3: (3.1824463, 5.8409093),
+    4: (2.7764451, 4.6040949),
+    5: (2.5705818, 4.0321430),
+    10: (2.2281389, 3.1692727),
+    30: (2.0422725, 2.7499957),
+    100: (1.9839715, 2.6258905),
+}
+
+
+def values(n=10000, seed=0):
+    return np.random.default_rng(seed).lognormal(6, 0.5, size=n)
+
+
+# ---------------------------------------------------------------
+@pytest.mark.parametrize('df', sorted(t_table))
+def test_t_quantile(df):
+    for p, expected in zip((0.975, 0.995), t_table[df]):
+        tolerance = 1e-7 if df <= 2 else 1e-2 if df < 5 else 1e-3
+        assert t_quantile(p, df) == pytest.approx(expected, rel=tolerance)
+        assert t_quantile(1 - p, df) == pytest.approx(-t_quantile(p, df))
+
+
+def test_confidence_interval():
+    sample = np.array([10.0, 12.0, 9.0, 11.0, 13.0, 10.0])
+    mean, half_width = confidence_interval(sample, 0.95)
+    assert mean == pytest.approx(sample.mean())
+    assert half_width == pytest.approx(t_table[5][0] * sample.std(ddof=1) / math.sqrt(6), rel=1e-3)
+    # wider for a higher confidence
+    assert confidence_interval(sample, 0.99)[1] > half_width
+
+
+def test_confidence_interval_too_few_values():
+    mean, half_width = confidence_interval([3.0])
+    assert mean == 3.0 and math.isnan(half_width)
+    mean, half_width = confidence_interval([])
+    assert math.isnan(mean) and math.isnan(half_width)
+
+
+# ---------------------------------------------------------------
+def check_stats(stats, data):
+    assert stats.count == len(data)
+    assert stats.mean == pytest.approx(data.mean())
+    assert stats.variance == pytest.approx(data.var(ddof=1))
+    assert stats.total == pytest.approx(data.sum())
+    assert stats.min == data.min() and stats.max == data.max()
+
+
+def test_running_stats():
+    data = values(1000)
+    stats = RunningStats()
+    for value in data:
+        stats.add(value)
+    check_stats(stats, data)
+
+
+def test_running_stats_merge():
+    data = values()
+    parts = np.split(data, [100, 101, 5000])
+    merged = RunningStats()
+    for part in parts:
+        stats = RunningStats()
+        stats.add_array(part)
+        merged.merge(stats)
+    # merging an empty aggregate changes nothing
+    merged.merge(RunningStats())
+    check_stats(merged, data)
+
+
+def test_running_stats_empty():
+    stats = RunningStats()
+    assert stats.count == 0 and math.isnan(stats.mean) and math.isnan(stats.variance)
+
+
+# ---------------------------------------------------------------
+@pytest.mark.parametrize('q', [0, 0.05, 0.25, 0.5, 0.75, 0.95, 1])
+def test_quantile_sketch(q):
+    data = values()
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.add_array(data)
+    expected = np.quantile(data, q, method='lower')
+    assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+
+
+def test_quantile_sketch_merge():
+    data = values()
+    whole = QuantileSketch()
+    whole.add_array(data)
+    merged = QuantileSketch()
+    for part in np.split(data, [3000, 7000]):
+        sketch = QuantileSketch()
+        for value in part:
+            sketch.add(value)
+        merged.merge(sketch)
+    assert merged.count == whole.count
+    assert merged.buckets == whole.buckets
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+def test_quantile_sketch_zeros():
+    sketch = QuantileSketch()
+    sketch.add_array([0.0, 0.0, 0.0, 10.0])
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1) == pytest.approx(10.0, rel=0.01)
+    assert math.isnan(QuantileSketch().quantile(0.5))
+
+
+# ---------------------------------------------------------------
+def brute_force_mser(series, batch_size, max_fraction=0.5):
+    number_of_batches = len(series) // batch_size
+    means = series[:number_of_batches * batch_size].reshape(-1, batch_size).mean(axis=1)
+    last = max(1, int(number_of_batches * max_fraction))
+    statistic = [means[d:].var() / len(means[d:]) for d in range(last)]
+    return int(np.argmin(statistic)) * batch_size
+
+
+def test_mser_finds_warmup():
+    rng = np.random.default_rng(1)
+    # 200 values that decay to the steady state, then 800 steady values
+    warmup = 1000 + 500 * np.exp(-np.arange(200) / 40)
+    series = np.concatenate((warmup, 1000 + rng.normal(0, 20, 800))) + rng.normal(0, 20, 1000)
+    truncation = mser(series)
+    assert truncation % 5 == 0
+    assert 100 <= truncation <= 300
+
+
+@pytest.mark.parametrize('batch_size', [1, 5, 10])
+def test_mser_matches_definition(batch_size):
+    rng = np.random.default_rng(2)
+    series = np.concatenate((np.linspace(2000, 1000, 150), 1000 + rng.normal(0, 50, 850)))
+    assert mser(series, batch_size) == brute_force_mser(series, batch_size)
+
+
+def test_mser_short_series():
+    assert mser([]) == 0
+    assert mser([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]) == 0
+    # never beyond max_fraction of the series
+    assert mser(np.arange(100.0, 0, -1), max_fraction=0.5) <= 50
+
+
+# ---------------------------------------------------------------
+def trip_stats_run(model_class, scenario=8, seed=1234567, run_length=1500):
+    model = model_class(seed=seed, scenario=scenario, trip_log=True, trip_stats=True)
+    if model_class is BangladeshModel:
+        for _ in range(run_length):
+            model.step()
+    else:
+        model.run(run_length)
+    return model
+
+
+@pytest.mark.parametrize('model_class', [BangladeshModel, VectorizedModel])
+def test_trip_stats_match_trip_log(model_class):
+    # the sinks of BangladeshModel record the trips one by one, VectorizedModel records them per tick (record_many)
+    model = trip_stats_run(model_class)
+    trips = model.trip_log.to_dataframe()
+    travel_time = (trips['removed_at_step'] - trips['generated_at_step']).to_numpy(dtype=np.float64)
+    summary = model.trip_stats.summary()
+    assert summary['trips'] == len(trips) > 0
+    assert summary['travel_time_mean'] == pytest.approx(travel_time.mean(), rel=1e-12)
+    assert summary['travel_time_std'] == pytest.approx(travel_time.std(ddof=1), rel=1e-9)
+    assert summary['travel_time_min'] == travel_time.min()
+    assert summary['travel_time_max'] == travel_time.max()
+    for q in (0.05, 0.5, 0.95):
+        expected = np.quantile(travel_time, q, method='lower')
+        assert summary[f'travel_time_{q:.0%}'] == pytest.approx(expected, rel=0.01)
+    assert summary['delay_mean'] == pytest.approx(trips['delay'].mean(), rel=1e-12)
+    assert summary['delay_total'] == pytest.approx(trips['delay'].sum(), rel=1e-12)
+
+    od = model.trip_stats.od_table()
+    expected = trips.assign(travel_time=travel_time).groupby(['origin', 'destination'])['travel_time']
+    np.testing.assert_array_equal(od['count'], expected.count())
+    np.testing.assert_allclose(od['mean'], expected.mean(), rtol=1e-12)
+    np.testing.assert_allclose(od['total'], expected.sum(), rtol=1e-12)
+
+
+def test_trip_stats_same_for_engines():
+    stepped, vectorized = trip_stats_run(BangladeshModel), trip_stats_run(VectorizedModel)
+    assert vectorized.trip_stats.summary() == pytest.approx(stepped.trip_stats.summary(), rel=1e-12)
+    pd.testing.assert_frame_equal(vectorized.trip_stats.bridge_table(), stepped.trip_stats.bridge_table(),
+                                  rtol=1e-12)
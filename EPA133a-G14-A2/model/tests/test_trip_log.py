@@ -0,0 +1,50 @@
+import numpy as np
+
+from trip_log import TripLog
+
+"""
+    The trip log grows past its initial capacity without losing records
+"""
+
+
+def records(n):
+    return [(i, 100 + i % 3, 200 + i % 5, i, i + 50 + i % 7, float(i % 4)) for i in range(n)]
+
+
+def test_record_grows():
+    trip_log = TripLog(capacity=2)
+    for record in records(9):
+        trip_log.record(*record)
+    assert len(trip_log) == 9
+    assert len(trip_log.columns['truck_id']) == 16
+    df = trip_log.to_dataframe()
+    assert [tuple(row) for row in df[list(TripLog.fields)].itertuples(index=False)] == records(9)
+    np.testing.assert_array_equal(df['driving_time'], df['removed_at_step'] - df['generated_at_step'])
+
+
+def test_extend_grows():
+    trip_log = TripLog(capacity=3)
+    trip_log.record(*records(1)[0])
+    columns = dict(zip(TripLog.fields, map(np.array, zip(*records(20)))))
+    trip_log.extend(**columns)
+    assert len(trip_log) == 21
+    assert len(trip_log.columns['truck_id']) >= 21
+    np.testing.assert_array_equal(trip_log.to_dataframe()['truck_id'], [0] + list(range(20)))
+
+
+def test_clear_keeps_arrays():
+    trip_log = TripLog(capacity=2)
+    for record in records(5):
+        trip_log.record(*record)
+    capacity = len(trip_log.columns['truck_id'])
+    trip_log.clear()
+    assert len(trip_log) == 0
+    assert len(trip_log.to_dataframe()) == 0
+    assert len(trip_log.columns['truck_id']) == capacity
+
+
+def test_from_columns():
+    columns = dict(zip(TripLog.fields, map(np.array, zip(*records(7)))))
+    trip_log = TripLog.from_columns(**columns)
+    assert len(trip_log) == 7
+    np.testing.assert_array_equal(trip_log.to_dataframe()['origin'], columns['origin'])
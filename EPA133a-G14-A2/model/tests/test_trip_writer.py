@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import trip_writer
+from analysis import load_trips
+from model import BangladeshModel
+from trip_log import TripLog
+from trip_writer import TripWriter, read_trips, columns
+
+"""
+    The trip files in both formats: Parquet (with pyarrow) and the csv fallback (without)
+"""
+
+formats = ['parquet', 'csv']
+
+
+@pytest.fixture(params=formats)
+def file_format(request, monkeypatch):
+    if request.param == 'parquet':
+        pytest.importorskip('pyarrow')
+    else:
+        # as if pyarrow were not installed
+        monkeypatch.setattr(trip_writer, 'pa', None)
+    return request.param
+
+
+def make_log(first, n):
+    truck_id = np.arange(first, first + n)
+    return TripLog.from_columns(truck_id=truck_id, origin=truck_id % 3, destination=truck_id % 5 + 10,
+                                generated_at_step=truck_id, removed_at_step=truck_id + 100 + truck_id % 7,
+                                delay=(truck_id % 4) * 12.345678901234)
+
+
+def expected_trips(trip_log, scenario, seed):
+    df = trip_log.to_dataframe()
+    return pd.DataFrame({
+        'scenario': np.full(len(df), scenario, dtype=np.int64),
+        'seed': np.full(len(df), seed, dtype=np.int64),
+        'truck_id': df['truck_id'],
+        'origin': df['origin'],
+        'sink': df['destination'],
+        'start': df['generated_at_step'],
+        'end': df['removed_at_step'],
+        'travel_time': df['driving_time'],
+        'delay': df['delay'],
+    })
+
+
+def test_write_and_read(tmp_path, file_format):
+    path = str(tmp_path / f'seed=7.{file_format}')
+    with TripWriter(path, scenario=3, seed=7) as writer:
+        writer.write(make_log(0, 10))
+        writer.write(TripLog())
+        writer.write(make_log(10, 5))
+    assert writer.size == 15
+    trips = read_trips(path)
+    assert dict(trips.dtypes) == {name: np.dtype(dtype) for name, dtype in columns.items()}
+    pd.testing.assert_frame_equal(trips, expected_trips(make_log(0, 15), 3, 7))
+
+
+def test_model_streams_trips(tmp_path, file_format):
+    """
+    A run that writes its trips in small batches gives the same trips as one that keeps them all
+    """
+    scenario, seed, run_length = 8, 1234567, 1500
+    reference = BangladeshModel(seed=seed, scenario=scenario, trip_log=True)
+    path = str(tmp_path / f'seed={seed}.{file_format}')
+    with TripWriter(path, scenario, seed, batch_size=64) as writer:
+        model = BangladeshModel(seed=seed, scenario=scenario, trip_writer=writer)
+        for _ in range(run_length):
+            reference.step()
+            model.step()
+        model.flush_trips()
+    expected = expected_trips(reference.trip_log, scenario, seed)
+    pd.testing.assert_frame_equal(read_trips(path), expected)
+
+
+def test_load_both_formats(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    output_dir = tmp_path / 'experiment'
+    os.makedirs(output_dir / 'trips' / 'scenario=0')
+    with TripWriter(str(output_dir / 'trips' / 'scenario=0' / 'seed=1.parquet'), 0, 1) as writer:
+        writer.write(make_log(0, 4))
+    monkeypatch.setattr(trip_writer, 'pa', None)
+    with TripWriter(str(output_dir / 'trips' / 'scenario=0' / 'seed=2.csv'), 0, 2) as writer:
+        writer.write(make_log(0, 6))
+    monkeypatch.undo()
+    trips = load_trips(str(output_dir), workers=1, use_cache=False)
+    assert trips.groupby('seed').size().to_dict() == {1: 4, 2: 6}
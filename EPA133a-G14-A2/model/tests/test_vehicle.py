@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from components import Vehicle
+
+"""
+    Fast-forwarding a vehicle (idle_ticks and skip) gives exactly the state that driving tick by tick gives
+"""
+
+distance = Vehicle.speed * Vehicle.step_time
+
+
+class Location:
+    def __init__(self, length):
+        self.length = length
+
+
+class Crossed(Exception):
+    pass
+
+
+def vehicle_at(length, entry_offset, driven_ticks=0, state=Vehicle.State.DRIVE, waiting_time=0):
+    vehicle = Vehicle.__new__(Vehicle)
+    vehicle.location = Location(length)
+    vehicle.entry_offset = entry_offset
+    vehicle.driven_ticks = driven_ticks
+    vehicle.location_offset = vehicle.offset_after(driven_ticks)
+    vehicle.state = state
+    vehicle.waiting_time = waiting_time
+    return vehicle
+
+
+def states():
+    rng = np.random.default_rng(0)
+    cases = []
+    for _ in range(300):
+        length = float(rng.uniform(0, 20000))
+        cases.append((length, float(rng.uniform(0, min(length, 900))), 0))
+    # lengths that end exactly at a tick, or one ulp either side of it, where the division can be off
+    for ticks in (1, 2, 3, 7, 24, 1000):
+        for entry_offset in (0.0, 0.1, 12.5, 833.3):
+            end = entry_offset + ticks * distance
+            for length in (np.nextafter(end, 0), end, np.nextafter(end, np.inf)):
+                cases.append((float(length), entry_offset, 0))
+                cases.append((float(length), entry_offset, ticks // 2))
+    return cases
+
+
+def test_idle_ticks_and_skip_match_driving(monkeypatch):
+    def cross(self, distance_rest):
+        raise Crossed()
+
+    monkeypatch.setattr(Vehicle, 'drive_to_next', cross)
+    for length, entry_offset, driven_ticks in states():
+        stepped = vehicle_at(length, entry_offset, driven_ticks)
+        if stepped.location_offset > length:
+            # not a state a vehicle can be in
+            continue
+        idle_ticks = stepped.idle_ticks()
+        for _ in range(idle_ticks):
+            stepped.drive()
+        # the tick after the idle ticks reaches the next component
+        with pytest.raises(Crossed):
+            stepped.drive()
+
+        skipped = vehicle_at(length, entry_offset, driven_ticks)
+        skipped.skip(idle_ticks)
+        assert (skipped.driven_ticks, skipped.location_offset) == (stepped.driven_ticks, stepped.location_offset)
+
+
+@pytest.mark.parametrize('waiting_time', [0.5, 1.0, 1.25, 17.0, 59.99999999999, 239.123456789])
+def test_skip_waiting(waiting_time):
+    stepped = vehicle_at(100.0, 0.0, state=Vehicle.State.WAIT, waiting_time=waiting_time)
+    idle_ticks = stepped.idle_ticks()
+    for _ in range(idle_ticks):
+        stepped.waiting_time = max(stepped.waiting_time - 1, 0)
+    # still waiting after the idle ticks, done waiting in the tick after them
+    assert 0 < stepped.waiting_time <= 1
+    skipped = vehicle_at(100.0, 0.0, state=Vehicle.State.WAIT, waiting_time=waiting_time)
+    skipped.skip(idle_ticks)
+    assert skipped.waiting_time == stepped.waiting_time
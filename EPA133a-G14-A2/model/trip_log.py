@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+"""
+    Event-based log of the trips of the vehicles
+
+    Instead of asking every agent for its state at every tick (as the DataCollector does),
+    one record is written per vehicle when a sink removes it. The memory used therefore
+    grows with the number of trips, not with the number of agents times the number of ticks.
+"""
+
+
+# ---------------------------------------------------------------
+class TripLog:
+    """
+    Fixed-width trip records, stored column-wise in preallocated NumPy arrays
+
+    The arrays double in size when they are full, so appending a record is amortized O(1)
+
+    Attributes
+    __________
+    columns: dict
+        Key: field name
+        Value: array of that field; only the first `size` entries are filled
+
+    size: int
+        the number of trips recorded
+    """
+
+    # field name -> dtype of the fixed-width records
+    fields = {
+        'truck_id': np.int64,
+        'origin': np.int64,
+        'destination': np.int64,
+        'generated_at_step': np.int64,
+        'removed_at_step': np.int64,
+        'delay': np.float64,
+    }
+
+    def __init__(self, capacity=4096):
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in TripLog.fields.items()}
+
+    @classmethod
+    def from_columns(cls, **columns):
+        """
+        Create a log that holds the given arrays, one per field, as its records
+        """
+        size = len(columns['truck_id'])
+        trip_log = cls(capacity=max(size, 1))
+        for name, dtype in TripLog.fields.items():
+            trip_log.columns[name][:size] = np.asarray(columns[name], dtype=dtype)
+        trip_log.size = size
+        return trip_log
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        """
+        Drop all records, e.g. after they were written out; the arrays are kept for the next records
+        """
+        self.size = 0
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            grown = np.empty(2 * len(column), dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def record(self, truck_id, origin, destination, generated_at_step, removed_at_step, delay):
+        """
+        Append the record of one finished trip
+        """
+        if self.size == len(self.columns['truck_id']):
+            self._grow()
+        i = self.size
+        self.columns['truck_id'][i] = truck_id
+        self.columns['origin'][i] = origin
+        self.columns['destination'][i] = destination
+        self.columns['generated_at_step'][i] = generated_at_step
+        self.columns['removed_at_step'][i] = removed_at_step
+        self.columns['delay'][i] = delay
+        self.size += 1
+
+    def extend(self, **columns):
+        """
+        Append the records of several finished trips at once, given one array per field
+        """
+        count = len(columns['truck_id'])
+        while self.size + count > len(self.columns['truck_id']):
+            self._grow()
+        for name, column in self.columns.items():
+            column[self.size:self.size + count] = columns[name]
+        self.size += count
+
+    def to_dataframe(self):
+        """
+        All recorded trips as a dataframe, one row per trip, with the driving time added
+        """
+        df = pd.DataFrame({name: column[:self.size] for name, column in self.columns.items()})
+        df['driving_time'] = df['removed_at_step'] - df['generated_at_step']
+        return df
+
+    def to_sink_records(self):
+        """
+        The trips in the format of the agent DataCollector output of model_run.py
+
+        That is, a dataframe indexed by (Step, AgentID) of the sinks, with in 'Driving time of cars leaving'
+        the list of [truck, driving time] of the vehicles the sink removed in the tick before Step
+        """
+        trips = self.to_dataframe()
+        # the DataCollector collects at the end of the tick, after the step counter is increased
+        trips['Step'] = trips['removed_at_step'] + 1
+        trips['AgentID'] = trips['destination']
+        trips['truck'] = [['Truck' + str(truck_id), int(driving_time)]
+                          for truck_id, driving_time in zip(trips['truck_id'], trips['driving_time'])]
+        # a sink removes the vehicles of one tick in the order they were generated
+        trips = trips.sort_values(['Step', 'AgentID', 'truck_id'], kind='stable')
+        df = trips.groupby(['Step', 'AgentID'], sort=False)['truck'].agg(list).to_frame('Driving time of cars leaving')
+        df.insert(0, 'Delay time', np.nan)
+        return df
@@ -0,0 +1,347 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+"""
+    Online statistics of the trips of a run
+
+    The statistics are updated once per finished trip (and once per vehicle that waits at a
+    bridge), so a run can report its KPIs without keeping any trip records. The memory used
+    does not grow with the number of trips: a running mean and variance (Welford's algorithm),
+    one such aggregate per origin-destination pair and per bridge, and a quantile sketch with
+    a fixed relative accuracy, whose size only grows with the logarithm of the range of the values.
+"""
+
+
+# ---------------------------------------------------------------
+def t_quantile(p, df):
+    """
+    The p-quantile of Student's t distribution with df degrees of freedom
+
+    Exact for 1 and 2 degrees of freedom; a Cornish-Fisher expansion around the normal
+    quantile otherwise. For the quantiles of 95% and 99% intervals, the relative error is
+    below 1% at 3 and 4 degrees of freedom and below 0.1% from 5 on
+    """
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+            + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4))
+
+
+def confidence_interval(values, confidence=0.95):
+    """
+    The mean of the values and the half-width of its confidence interval (NaN for fewer than two values)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mean = float(values.mean()) if len(values) else math.nan
+    if len(values) < 2:
+        return mean, math.nan
+    t = t_quantile((1 + confidence) / 2, len(values) - 1)
+    return mean, t * float(values.std(ddof=1)) / math.sqrt(len(values))
+
+
+# ---------------------------------------------------------------
+class RunningStats:
+    """
+    Count, mean, variance, minimum, maximum and total of a stream of values, in constant memory
+
+    The mean and variance are updated with Welford's algorithm; two aggregates (e.g. of two runs)
+    are combined with merge
+
+    Attributes
+    __________
+    count: int
+        the number of values
+
+    mean: float
+        the mean of the values; NaN without values
+
+    total: float
+        the sum of the values
+
+    min, max: float
+        the smallest and largest value; NaN without values
+    """
+
+    __slots__ = ('count', 'mean', 'total', 'min', 'max', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = math.nan
+        self.total = 0.0
+        self.min = math.nan
+        self.max = math.nan
+        # the sum of the squared differences from the mean
+        self._m2 = 0.0
+
+    def add(self, value):
+        """
+        Add one value
+        """
+        self.count += 1
+        self.total += value
+        if self.count == 1:
+            self.mean = self.min = self.max = float(value)
+            return
+        difference = value - self.mean
+        self.mean += difference / self.count
+        self._m2 += difference * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_array(self, values):
+        """
+        Add all values of an array at once
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        batch = RunningStats()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.total = float(values.sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        batch._m2 = float(((values - batch.mean) ** 2).sum())
+        self.merge(batch)
+
+    def merge(self, other):
+        """
+        Add all values of another aggregate (Chan et al.'s parallel update)
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.total = other.count, other.mean, other.total
+            self.min, self.max, self._m2 = other.min, other.max, other._m2
+            return
+        count = self.count + other.count
+        difference = other.mean - self.mean
+        self.mean += difference * other.count / count
+        self._m2 += other._m2 + difference ** 2 * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """
+        The sample variance of the values; NaN with fewer than two values
+        """
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+# ---------------------------------------------------------------
+class QuantileSketch:
+    """
+    Approximate quantiles of a stream of non-negative values
+
+    Every positive value is counted in a logarithmic bucket (as in DDSketch), so a quantile is
+    returned within the relative accuracy of the true value, and the number of buckets only
+    depends on the ratio of the largest to the smallest value, not on the number of values.
+    Values of zero or less are counted apart.
+
+    Attributes
+    __________
+    relative_accuracy: float
+        the largest relative error of a quantile
+
+    count: int
+        the number of values
+
+    buckets: dict
+        Key: bucket index, a value v is in bucket ceil(log(v) / log(gamma))
+        Value: the number of values in the bucket
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        self.buckets = {}
+
+    def add(self, value):
+        """
+        Add one value
+        """
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        bucket = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def add_array(self, values):
+        """
+        Add all values of an array at once
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.count += len(values)
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        buckets, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+                                    return_counts=True)
+        for bucket, count in zip(buckets.tolist(), counts.tolist()):
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    def merge(self, other):
+        """
+        Add all values of another sketch with the same relative accuracy
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("only sketches with the same relative accuracy can be merged")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    def quantile(self, q):
+        """
+        The approximate q-quantile (0 <= q <= 1) of the values; NaN without values
+        """
+        if self.count == 0:
+            return math.nan
+        # the (0-based) rank of the value asked for, as in the lower nearest-rank method
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                # the value in the middle of the bucket, in relative terms
+                return 2 * self.gamma ** bucket / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+# ---------------------------------------------------------------
+class TripStatistics:
+    """
+    Online statistics of the trips of a run
+
+    BangladeshModel(..., trip_stats=True) creates one as model.trip_stats; the sinks record every
+    trip they remove in it and the vehicles every delay they get at a bridge
+
+    Attributes
+    __________
+    travel_time, delay: RunningStats
+        the travel time and the total bridge delay of all trips
+
+    travel_time_sketch: QuantileSketch
+        the approximate quantiles of the travel time of all trips
+
+    od: dict
+        Key: (origin, destination) ids
+        Value: RunningStats of the travel time of the trips from origin to destination
+
+    bridge_delay: dict
+        Key: bridge id
+        Value: RunningStats of the delays the vehicles got at the bridge
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.travel_time = RunningStats()
+        self.delay = RunningStats()
+        self.travel_time_sketch = QuantileSketch(relative_accuracy)
+        self.od = {}
+        self.bridge_delay = {}
+
+    def record(self, origin, destination, travel_time, delay):
+        """
+        Add one finished trip
+        """
+        self.travel_time.add(travel_time)
+        self.delay.add(delay)
+        self.travel_time_sketch.add(travel_time)
+        key = (origin, destination)
+        if key not in self.od:
+            self.od[key] = RunningStats()
+        self.od[key].add(travel_time)
+
+    def record_many(self, origins, destinations, travel_times, delays):
+        """
+        Add several finished trips at once, given one array per field
+        """
+        travel_times = np.asarray(travel_times, dtype=np.float64)
+        self.travel_time.add_array(travel_times)
+        self.delay.add_array(delays)
+        self.travel_time_sketch.add_array(travel_times)
+        keys = np.column_stack((origins, destinations))
+        unique_keys, pair = np.unique(keys, axis=0, return_inverse=True)
+        for i, key in enumerate(map(tuple, unique_keys.tolist())):
+            if key not in self.od:
+                self.od[key] = RunningStats()
+            self.od[key].add_array(travel_times[pair.ravel() == i])
+
+    def record_delay(self, bridge, delay):
+        """
+        Add the delay a vehicle got at a bridge
+        """
+        if bridge not in self.bridge_delay:
+            self.bridge_delay[bridge] = RunningStats()
+        self.bridge_delay[bridge].add(delay)
+
+    def merge(self, other):
+        """
+        Add all statistics of another TripStatistics, e.g. of another seed
+        """
+        self.travel_time.merge(other.travel_time)
+        self.delay.merge(other.delay)
+        self.travel_time_sketch.merge(other.travel_time_sketch)
+        for target, source in ((self.od, other.od), (self.bridge_delay, other.bridge_delay)):
+            for key, stats in source.items():
+                if key not in target:
+                    target[key] = RunningStats()
+                target[key].merge(stats)
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)):
+        """
+        The KPIs of the run as a dict: the number of trips, the mean, standard deviation, minimum,
+        maximum and approximate quantiles of the travel time, and the mean and total delay
+        """
+        kpis = {
+            'trips': self.travel_time.count,
+            'travel_time_mean': self.travel_time.mean,
+            'travel_time_std': self.travel_time.std,
+            'travel_time_min': self.travel_time.min,
+            'travel_time_max': self.travel_time.max,
+        }
+        for q in quantiles:
+            kpis[f'travel_time_{q:.0%}'] = self.travel_time_sketch.quantile(q)
+        kpis['delay_mean'] = self.delay.mean
+        kpis['delay_total'] = self.delay.total
+        return kpis
+
+    def od_table(self):
+        """
+        The travel time statistics per (origin, destination) pair, as a dataframe
+        """
+        return _stats_table(self.od, ['origin', 'destination'])
+
+    def bridge_table(self):
+        """
+        The delay statistics per bridge, as a dataframe; count is the number of vehicles that waited
+        """
+        return _stats_table(self.bridge_delay, ['bridge'])
+
+
+def _stats_table(aggregates, index_names):
+    rows = [(key if isinstance(key, tuple) else (key,)) +
+            (stats.count, stats.mean, stats.std, stats.min, stats.max, stats.total)
+            for key, stats in sorted(aggregates.items())]
+    return pd.DataFrame(rows, columns=index_names + ['count', 'mean', 'std', 'min', 'max', 'total']) \
+        .set_index(index_names)
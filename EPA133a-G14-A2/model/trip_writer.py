@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+"""
+    Streaming, typed output of the trips of a run
+
+    The trips of a run are written in batches while the run goes on, as typed columns, to one file
+    per (scenario, seed) in a partitioned directory layout:
+
+        <output_dir>/trips/scenario=<scenario>/seed=<seed>.parquet
+
+    so a long run never holds all its trips in memory, and the results can be read back without
+    parsing any strings. Every batch is a row group of the Parquet file. Without pyarrow the
+    same columns are appended to a csv file (seed=<seed>.csv) instead.
+"""
+
+# column name -> dtype of the trip records in the output
+columns = {
+    'scenario': np.int64,
+    'seed': np.int64,
+    'truck_id': np.int64,
+    'origin': np.int64,
+    'sink': np.int64,
+    'start': np.int64,
+    'end': np.int64,
+    'travel_time': np.int64,
+    'delay': np.float64,
+}
+
+extension = 'csv' if pa is None else 'parquet'
+
+
+# ---------------------------------------------------------------
+def trip_path(output_dir, scenario, seed):
+    """
+    The file the trips of a (scenario, seed) run are written to
+    """
+    return os.path.join(output_dir, 'trips', f'scenario={scenario}', f'seed={seed}.{extension}')
+
+
+def read_trips(path):
+    """
+    The trips in a file written by a TripWriter, as a dataframe with typed columns
+    """
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=columns, float_precision='round_trip')
+
+
+# ---------------------------------------------------------------
+class TripWriter:
+    """
+    Appends the trips of one run to its output file, one batch at a time
+
+    Use it as a context manager, or call close() at the end of the run, so that the file is complete
+
+    Attributes
+    __________
+    path: str
+        the file the trips are written to
+
+    batch_size: int
+        the number of trips a model collects before it writes them (see BangladeshModel.flush_trips)
+
+    size: int
+        the number of trips written so far
+    """
+
+    def __init__(self, path, scenario, seed, batch_size=4096):
+        self.path = path
+        self.scenario = scenario
+        self.seed = seed
+        self.batch_size = batch_size
+        self.size = 0
+        self._writer = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if pa is None:
+            # the header only; the batches are appended below it
+            pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in columns.items()}).to_csv(path, index=False)
+        else:
+            schema = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in columns.items()])
+            self._writer = pq.ParquetWriter(path, schema)
+
+    def write(self, trip_log):
+        """
+        Append all trips of a TripLog
+        """
+        n = len(trip_log)
+        if n == 0:
+            return
+        log = trip_log.columns
+        batch = {
+            'scenario': np.full(n, self.scenario, dtype=np.int64),
+            'seed': np.full(n, self.seed, dtype=np.int64),
+            'truck_id': log['truck_id'][:n],
+            'origin': log['origin'][:n],
+            'sink': log['destination'][:n],
+            'start': log['generated_at_step'][:n],
+            'end': log['removed_at_step'][:n],
+            'travel_time': log['removed_at_step'][:n] - log['generated_at_step'][:n],
+            'delay': log['delay'][:n],
+        }
+        if self._writer is None:
+            pd.DataFrame(batch).to_csv(self.path, mode='a', header=False, index=False)
+        else:
+            self._writer.write_table(pa.table(batch, schema=self._writer.schema))
+        self.size += n
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
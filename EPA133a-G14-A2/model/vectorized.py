@@ -0,0 +1,245 @@
+import numpy as np
+
+from model import BangladeshModel
+from components import Bridge, Sink, Vehicle
+
+"""
+    Struct-of-arrays vehicle kinematics for BangladeshModel
+
+    Instead of one Vehicle object per truck, all active trucks are kept in NumPy arrays, and all
+    of them are moved in one vectorized update per tick. A truck's position is the distance it
+    has driven along its route; it crosses a component boundary when that distance passes the
+    cumulative start of the component. Only the broken bridges and the sink change anything for
+    a truck, so only those boundaries are checked every tick.
+
+    The Bridge and Source agents of the model are still used for the delay times and the route
+    choice, and the trips are written to the trip log, which gives the same trips as a
+    BangladeshModel run with trip_log=True.
+"""
+
+
+# ---------------------------------------------------------------
+class VectorizedModel(BangladeshModel):
+    """
+    BangladeshModel with all trucks in arrays instead of Vehicle agents
+
+    The infrastructure agents are not stepped; the sources generate the trucks from the model
+    step. The trips are recorded in the trip log (model.trip_log).
+
+    Attributes
+    __________
+    local_routes: dict
+        Key: a route id of the route table, Value: the local index of the route in this model;
+        the trucks hold local indices, and route_keys, route_paths, route_starts and route_ends
+        keep the data of every local route, also when the route table evicts it from its cache
+
+    stop_position, stop_component: 2D arrays
+        per local route, the start position and path index of the broken bridges on the route,
+        followed by the sink, padded with the sink to the same number of stops for every route
+
+    trucks: dict
+        Key: field name
+        Value: array of that field for all active trucks, in the order they were generated;
+        only the first `size` entries are in use
+
+    size: int
+        the number of active trucks
+    """
+
+    DRIVE = 1
+    WAIT = 2
+
+    fields = {
+        'truck_id': np.int64,
+        'route': np.int64,
+        'generated_at_step': np.int64,
+        'position': np.float64,
+        'location_index': np.int64,
+        'location_offset': np.float64,
+        'waiting_time': np.float64,
+        'state': np.int8,
+        'next_stop': np.int64,
+        'delay': np.float64,
+    }
+
+    def __init__(self, seed, scenario, x_max=500, y_max=500, x_min=0, y_min=0, capacity=1024, **kwargs):
+        # the trips are always recorded in the trip log, also when the caller passes trip_log
+        kwargs['trip_log'] = True
+        super().__init__(seed, scenario, x_max, y_max, x_min, y_min, **kwargs)
+        self.size = 0
+        self.trucks = {name: np.zeros(capacity, dtype=dtype) for name, dtype in VectorizedModel.fields.items()}
+        self.local_routes = {}
+        self.route_keys = []
+        self.route_paths = []
+        self.route_starts = []
+        self.route_ends = []
+        self.route_stops = []
+        self.stop_component = None
+        self.stop_position = None
+
+    def local_route(self, route):
+        """
+        The local index of a route of the route table; the first time a route is used, its arrays are
+        kept and its stops (its broken bridges and its sink) are added to the stop tables
+        """
+        local = self.local_routes.get(route)
+        if local is None:
+            local = len(self.route_keys)
+            self.local_routes[route] = local
+            path = self.route_table.paths[route]
+            self.route_keys.append(self.route_table.keys[route])
+            self.route_paths.append(path)
+            self.route_starts.append(self.route_table.starts[route])
+            self.route_ends.append(self.route_table.ends[route])
+            route_stops = [i for i, infra_index in enumerate(path)
+                           if isinstance(self.infra[infra_index], Bridge) and self.infra[infra_index].delay_time != 0]
+            route_stops.append(len(path) - 1)
+            self.route_stops.append(route_stops)
+
+            max_stops = max(len(route_stops) for route_stops in self.route_stops)
+            self.stop_component = np.array([route_stops + [route_stops[-1]] * (max_stops - len(route_stops))
+                                            for route_stops in self.route_stops], dtype=np.int64)
+            self.stop_position = np.array([starts[components] for starts, components
+                                           in zip(self.route_starts, self.stop_component)])
+        return local
+
+    def _grow(self):
+        for name, column in self.trucks.items():
+            grown = np.zeros(2 * len(column), dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.trucks[name] = grown
+
+    def generate_trucks(self):
+        """
+        Let every source whose generation tick it is add a truck to the arrays
+        """
+        step = self.schedule.steps
+        for source_id in self.sources:
+            source = self.infra[self.route_table.index[source_id]]
+            if step % source.generation_frequency != 0:
+                source.vehicle_generated_flag = False
+                continue
+            if self.size == len(self.trucks['truck_id']):
+                self._grow()
+            i = self.size
+            self.trucks['truck_id'][i] = self.truck_counter
+            self.trucks['route'][i] = self.local_route(self.get_random_route(source_id))
+            self.trucks['generated_at_step'][i] = step
+            self.trucks['position'][i] = 0.0
+            self.trucks['location_index'][i] = 0
+            self.trucks['location_offset'][i] = 0.0
+            self.trucks['waiting_time'][i] = 0.0
+            self.trucks['state'][i] = VectorizedModel.DRIVE
+            self.trucks['next_stop'][i] = 0
+            self.trucks['delay'][i] = 0.0
+            self.size += 1
+            self.truck_counter += 1
+            source.vehicle_count += 1
+            source.vehicle_generated_flag = True
+
+    def move_trucks(self):
+        """
+        Advance all active trucks by one tick
+        """
+        n = self.size
+        if n == 0:
+            return
+        step = self.schedule.steps
+        trucks = {name: column[:n] for name, column in self.trucks.items()}
+        state = trucks['state']
+        waiting_time = trucks['waiting_time']
+        position = trucks['position']
+        route = trucks['route']
+        next_stop = trucks['next_stop']
+
+        # the waiting trucks count down; the ones that are done drive on in this tick
+        waiting = state == VectorizedModel.WAIT
+        if waiting.any():
+            waiting_time[waiting] = np.maximum(waiting_time[waiting] - 1, 0)
+            state[waiting & (waiting_time == 0)] = VectorizedModel.DRIVE
+
+        driving = state == VectorizedModel.DRIVE
+        position[driving] += Vehicle.speed * Vehicle.step_time
+
+        # a truck arrives at its next stop (a broken bridge or its sink) when it drives past its start
+        stop_position = self.stop_position[route, next_stop]
+        arrived = np.flatnonzero(driving & (position > stop_position))
+        removed = []
+        # in the order the trucks were generated, since the bridges draw their delays in that order
+        for i in arrived:
+            component = self.stop_component[route[i], next_stop[i]]
+            infra = self.infra[self.route_paths[route[i]][component]]
+            if isinstance(infra, Sink):
+                removed.append(i)
+                infra.vehicle_removed_toggle = not infra.vehicle_removed_toggle
+                continue
+            waiting_time[i] = infra.get_delay_time()
+            trucks['delay'][i] += waiting_time[i]
+            if self.trip_stats is not None and waiting_time[i] > 0:
+                self.trip_stats.record_delay(infra.unique_id, waiting_time[i])
+            position[i] = stop_position[i]
+            state[i] = VectorizedModel.WAIT
+            next_stop[i] += 1
+
+        if removed:
+            self.remove_trucks(np.array(removed), step)
+        self.locate_trucks()
+
+    def locate_trucks(self):
+        """
+        Find the component (location_index) and location_offset of every active truck
+        """
+        n = self.size
+        route = self.trucks['route'][:n]
+        position = self.trucks['position'][:n]
+        location_index = self.trucks['location_index'][:n]
+        # a waiting truck is at the start of the bridge it stopped at
+        waiting = self.trucks['state'][:n] == VectorizedModel.WAIT
+        location_index[waiting] = self.stop_component[route[waiting], self.trucks['next_stop'][:n][waiting] - 1]
+        for r in np.unique(route):
+            on_route = route == r
+            driving = on_route & ~waiting
+            location_index[driving] = np.searchsorted(self.route_ends[r], position[driving], side='left')
+            self.trucks['location_offset'][:n][on_route] = (position[on_route] -
+                                                            self.route_starts[r][location_index[on_route]])
+
+    def remove_trucks(self, removed, step):
+        """
+        Write the trips of the removed trucks to the trip log and drop them from the arrays
+        """
+        route = self.trucks['route'][removed]
+        origins = np.array([self.route_keys[r][0] for r in route], dtype=np.int64)
+        destinations = np.array([self.route_keys[r][1] for r in route], dtype=np.int64)
+        self.trip_log.extend(truck_id=self.trucks['truck_id'][removed], origin=origins, destination=destinations,
+                             generated_at_step=self.trucks['generated_at_step'][removed],
+                             removed_at_step=np.full(len(removed), step), delay=self.trucks['delay'][removed])
+        if self.trip_stats is not None:
+            self.trip_stats.record_many(origins, destinations, step - self.trucks['generated_at_step'][removed],
+                                        self.trucks['delay'][removed])
+        if self.steady_state is not None:
+            self.steady_state.record_many(step - self.trucks['generated_at_step'][removed], step)
+
+        keep = np.ones(self.size, dtype=bool)
+        keep[removed] = False
+        kept = int(keep.sum())
+        for column in self.trucks.values():
+            column[:kept] = column[:self.size][keep]
+        self.size = kept
+
+    def step(self):
+        """
+        Advance the simulation by one step.
+        """
+        self.move_trucks()
+        self.generate_trucks()
+        self.collect_trips()
+        self.schedule.steps += 1
+        self.schedule.time += 1
+        self.check_steady_state()
+
+    def run(self, run_length):
+        """
+        Advance the simulation up to tick run_length
+        """
+        while self.running and self.schedule.steps < run_length:
+            self.step()